@@ -0,0 +1,90 @@
+"""Compares the bracket distance functions.
+
+Times the level by level distance walk that `brackets_depth_distance`
+used before, against the bit arithmetic one and the precomputed
+distance table, for brackets from 8 to 4096 clashes.
+
+Usage:
+    python -m benchmarks.bench_distance
+"""
+
+import math
+import random
+import timeit
+
+from bracketool.brackets import brackets_depth_distance
+from bracketool.brackets import clashes_depth_distance
+from bracketool.brackets import depth_distance_table
+from bracketool.domain import Clash
+
+
+SIZES = [8, 32, 128, 512, 1024, 4096]
+NUM_PAIRS = 20000
+
+
+def loop_depth_distance(clashes, idx_a, idx_b):
+    """Previous implementation of `brackets_depth_distance`."""
+    n_clashes = len(clashes)
+    if idx_a < 0 or idx_a >= n_clashes:
+        raise IndexError('idx_a index out of range')
+    if idx_b < 0 or idx_b >= n_clashes:
+        raise IndexError('idx_b index out of range')
+    if idx_a == idx_b:
+        return 1
+    max_distance = int(math.log(n_clashes, 2)) + 1
+    s = n_clashes // 2
+    while s > 0 and idx_a // s == idx_b // s:
+        max_distance = max_distance - 1
+        s = s // 2
+    return max_distance
+
+
+def bench_size(num_clashes, rnd):
+    clashes = [Clash() for _ in range(num_clashes)]
+    pairs = [(rnd.randrange(num_clashes), rnd.randrange(num_clashes))
+             for _ in range(NUM_PAIRS)]
+
+    def run_loop():
+        for a, b in pairs:
+            loop_depth_distance(clashes, a, b)
+
+    def run_checked():
+        for a, b in pairs:
+            brackets_depth_distance(clashes, a, b)
+
+    def run_bits():
+        for a, b in pairs:
+            clashes_depth_distance(a, b)
+
+    table_build = timeit.timeit(
+            lambda: depth_distance_table.__wrapped__(num_clashes), number=1)
+    table = depth_distance_table(num_clashes)
+
+    def run_table():
+        for a, b in pairs:
+            table[a][b]
+
+    return {
+        'loop': min(timeit.repeat(run_loop, number=1, repeat=3)),
+        'checked': min(timeit.repeat(run_checked, number=1, repeat=3)),
+        'bits': min(timeit.repeat(run_bits, number=1, repeat=3)),
+        'table': min(timeit.repeat(run_table, number=1, repeat=3)),
+        'table_build': table_build,
+    }
+
+
+def main():
+    rnd = random.Random(42)
+    print('{} distance computations per size (times in ms)'.format(NUM_PAIRS))
+    print('{:>8} {:>10} {:>10} {:>10} {:>10} {:>12}'.format(
+        'clashes', 'loop', 'checked', 'bits', 'table', 'table_build'))
+    for num_clashes in SIZES:
+        res = bench_size(num_clashes, rnd)
+        print('{:>8} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>12.2f}'.format(
+            num_clashes, res['loop'] * 1000, res['checked'] * 1000,
+            res['bits'] * 1000, res['table'] * 1000,
+            res['table_build'] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Benchmarks the bracket generation functions.
+
+Measures the time and peak memory (as traced by tracemalloc) of:
+
+- generate_first_round_clashes
+- create_reserved_teams_bracket_clashes (greedy, and split in subtrees)
+- PairingsGenerator.generate, with teams and rating on and off
+- SingleEliminationGen.generate
+
+for synthetic competitor lists of several sizes, and saves the results
+as JSON so different versions can be compared.
+
+Team size distributions:
+
+- none: competitors without team
+- singles: every competitor in its own team
+- uniform:N: teams with 1 to N members
+- clubs:N: N clubs, with sizes decreasing like 1/rank (a few big clubs
+  and many small ones)
+
+Usage:
+    python -m benchmarks.bench_generation [--sizes 4,16,64]
+        [--teams clubs:40] [--repeat 3] [--seed 42] [--output FILE]
+"""
+
+import argparse
+import json
+import platform
+import random
+import time
+import tracemalloc
+
+from bracketool.brackets import generate_first_round_clashes
+from bracketool.domain import Competitor
+from bracketool.pairings import PairingsGenerator
+from bracketool.single_elimination import SingleEliminationGen
+from bracketool.teambrackets import create_reserved_teams_bracket_clashes
+
+
+DEFAULT_SIZES = [4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192]
+
+
+def synthetic_teams(num_competitors, distribution, rnd):
+    """Returns the team of each competitor for a team size
+    distribution (see the module documentation)."""
+    name, _, param = distribution.partition(':')
+    if name == 'none':
+        return [None] * num_competitors
+    elif name == 'singles':
+        return ['team{}'.format(idx) for idx in range(num_competitors)]
+    elif name == 'uniform':
+        max_size = int(param)
+        teams = []
+        while len(teams) < num_competitors:
+            size = rnd.randint(1, max_size)
+            teams.extend(['team{}'.format(len(teams))] * size)
+        return teams[:num_competitors]
+    elif name == 'clubs':
+        num_clubs = int(param)
+        weights = [1.0 / rank for rank in range(1, num_clubs + 1)]
+        return ['team{}'.format(idx) for idx in rnd.choices(
+            range(num_clubs), weights=weights, k=num_competitors)]
+    raise ValueError('unknown team distribution {}'.format(distribution))
+
+
+def synthetic_competitors(num_competitors, distribution, rnd):
+    teams = synthetic_teams(num_competitors, distribution, rnd)
+    rnd.shuffle(teams)
+    return [Competitor('comp{}'.format(idx), team, rnd.randint(800, 2400))
+            for idx, team in enumerate(teams)]
+
+
+def cases(seed):
+    """Returns (name, function) pairs, where function runs the
+    benchmarked call for a competitor list."""
+    def pairings(use_teams, use_rating):
+        def run(competitors):
+            PairingsGenerator(use_teams=use_teams, use_rating=use_rating,
+                              random_seed=seed).generate(competitors, {})
+        return run
+
+    def single_elimination(competitors):
+        SingleEliminationGen(use_three_way_final=False,
+                             random_seed=seed).generate(competitors, {})
+
+    return [
+        ('generate_first_round_clashes',
+         lambda competitors: generate_first_round_clashes(len(competitors))),
+        ('create_reserved_teams_bracket_clashes',
+         lambda competitors: create_reserved_teams_bracket_clashes(
+             competitors, {}, random.Random(seed))),
+        ('create_reserved_teams_bracket_clashes_split',
+         lambda competitors: create_reserved_teams_bracket_clashes(
+             competitors, {}, random.Random(seed), split_cutoff=64)),
+        ('pairings_teams_rating', pairings(True, True)),
+        ('pairings_teams', pairings(True, False)),
+        ('pairings_rating', pairings(False, True)),
+        ('pairings_random', pairings(False, False)),
+        ('single_elimination', single_elimination),
+    ]
+
+
+def measure(func, competitors, repeat):
+    """Returns the best time, and the peak memory of a traced run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(competitors)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(competitors)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def run(sizes, teams, repeat, seed):
+    results = []
+    for size in sizes:
+        competitors = synthetic_competitors(size, teams, random.Random(seed))
+        for name, func in cases(seed):
+            seconds, peak = measure(func, competitors, repeat)
+            results.append({'case': name, 'size': size, 'seconds': seconds,
+                            'peak_memory': peak})
+            print('{:<40} {:>6} {:>12.4f}s {:>12} bytes'.format(
+                name, size, seconds, peak))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated number of competitors')
+    parser.add_argument('--teams', default='clubs:40',
+                        help='team size distribution')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs for each case (the best is kept)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_generation.json',
+                        help='JSON file to save the results')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run(sizes, args.teams, args.repeat, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'teams': args.teams,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'results': results,
+        }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
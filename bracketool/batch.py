@@ -0,0 +1,128 @@
+"""Generate the brackets for many categories in one call.
+
+Categories are generated in their given order, as if
+`SingleEliminationGen.generate` was called for each one of them
+sharing the same `team_pairing_count` dict. A category only reads and
+updates the pairing counts of its own teams, so categories that do not
+share any team with the ones still being generated are independent,
+and are spread across a process pool. Each one waits for the previous
+categories it shares teams with, and its pairing counts are merged
+back as soon as it finishes, so results are the same as in a
+sequential run for a given seed, whatever the number of processes.
+
+The instrumentation of the generator is not sent to the workers: each
+one measures its category with a `worker` instrumentation, and the
+report is recorded (calling the callback) in this process when the
+category finishes.
+"""
+
+import copy
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+
+from bracketool.teambrackets import teams_pairing_count
+
+
+def category_teams(competitor_list):
+    """Returns the set of teams of a list of competitors."""
+    return {comp.team for comp in competitor_list if comp.team is not None}
+
+
+def _generate_category(generator, pairings_generator, competitor_list,
+                       team_pairing_count, presorted):
+    res = generator._generate(pairings_generator, competitor_list,
+                              team_pairing_count, presorted)
+    report = getattr(generator.instrumentation, 'last_report', None)
+    return res, team_pairing_count, report
+
+
+def _worker_generators(generator, pairings_generators):
+    """Returns a copy of the generator, and sets the pairings
+    generators, to use a `worker` instrumentation."""
+    instrumentation = generator.instrumentation.worker()
+    worker_generator = copy.copy(generator)
+    worker_generator.instrumentation = instrumentation
+    for pg in pairings_generators:
+        pg.instrumentation = instrumentation
+    return worker_generator
+
+
+def generate_categories(generator, categories, team_pairing_count=None,
+                        processes=None, presorted=False):
+    """Generates the brackets for several categories.
+
+    :param generator: a `SingleEliminationGen`, its random seed
+        is used for the categories in the same way as calling its
+        generate method for each one of them.
+    :param categories: an ordered mapping of category ids to lists
+        of competitors.
+    :param team_pairing_count: a dict counting the number of times
+        that teams have already been paired. It is updated in place
+        with the pairings of all the categories.
+    :param processes: maximum number of worker processes. If it is 1,
+        categories are generated in this process. If None, it uses
+        the number of processors.
+    :param presorted: the competitor lists are already sorted for
+        seeding (see `bracketool.loader`).
+
+    :returns: a dict with the generated result for each category id
+        (when using worker processes, results hold copies of the
+        competitors).
+    """
+    if team_pairing_count is None:
+        team_pairing_count = {}
+    category_ids = list(categories)
+    pairings_generators = [generator._pairings_generator()
+                           for _ in category_ids]
+    if processes == 1:
+        return {cat_id: generator._generate(pg, categories[cat_id],
+                                            team_pairing_count, presorted)
+                for cat_id, pg in zip(category_ids, pairings_generators)}
+
+    # each category depends on the last previous category that had
+    # any of its teams
+    teams = [category_teams(categories[cat_id]) for cat_id in category_ids]
+    pending_deps = []
+    dependents = [[] for _ in category_ids]
+    last_with_team = {}
+    for idx, cat_teams in enumerate(teams):
+        deps = {last_with_team[team] for team in cat_teams
+                if team in last_with_team}
+        for dep in deps:
+            dependents[dep].append(idx)
+        pending_deps.append(len(deps))
+        for team in cat_teams:
+            last_with_team[team] = idx
+
+    worker_generator = _worker_generators(generator, pairings_generators)
+    results = {}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        running = {}
+
+        def submit(idx):
+            cat_id = category_ids[idx]
+            future = executor.submit(
+                    _generate_category, worker_generator,
+                    pairings_generators[idx], categories[cat_id],
+                    teams_pairing_count(team_pairing_count, teams[idx]),
+                    presorted)
+            running[future] = idx
+
+        for idx, deps in enumerate(pending_deps):
+            if deps == 0:
+                submit(idx)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=running.get):
+                idx = running.pop(future)
+                res, cat_pairing_count, report = future.result()
+                results[category_ids[idx]] = res
+                team_pairing_count.update(cat_pairing_count)
+                if report is not None:
+                    generator.instrumentation.record(report)
+                for dep_idx in dependents[idx]:
+                    pending_deps[dep_idx] -= 1
+                    if pending_deps[dep_idx] == 0:
+                        submit(dep_idx)
+    return {cat_id: results[cat_id] for cat_id in category_ids}
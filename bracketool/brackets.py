@@ -5,62 +5,213 @@ elimination competition configurations.
 """
 
 import math
+from array import array
+from functools import lru_cache
 
 from bracketool.domain import Clash
 
-def _assign_byes(bracket_slots, begin, end, num_byes):
+def _assign_byes(bye_mask, begin, end, num_byes):
     """Distribute byes so competitors that have a bye in the
     first round have less chances to fight each other.
     """
     if num_byes > 1:
         mid = begin + (end - begin) // 2
         mid_byes = num_byes // 2
-        _assign_byes(bracket_slots, begin, mid, mid_byes)
-        _assign_byes(bracket_slots, mid, end, num_byes - mid_byes)
+        _assign_byes(bye_mask, begin, mid, mid_byes)
+        _assign_byes(bye_mask, mid, end, num_byes - mid_byes)
     elif num_byes == 1:
-        bracket_slots[begin].is_bye = True
+        bye_mask[begin] = 1
 
-def generate_first_round_clashes(num_participants):
-    """Generates the minimum number of clashes that fits the amount of
-    competitors.
 
-    Populate the 'byes' (the 'phantom' losers that will pair with competiors
-    that will pass automatically to the next round).
+@lru_cache(maxsize=256)
+def first_round_byes(num_participants):
+    """Returns the bye layout for the first round clashes: a bytes
+    object with 1 for the clashes that have a bye, and 0 for the rest.
+
+    Layouts are cached for the most recently used number of
+    participants.
     """
     if num_participants < 0:
         raise ValueError('number of participants must be 0 or greater')
     elif num_participants < 2:
-        return []
+        return bytes()
     first_round_slots = (1 << int(math.ceil(math.log(num_participants, 2))))
     num_clashes = first_round_slots // 2
     num_byes = first_round_slots - num_participants
-    bracket_slots = [Clash() for _ in range(num_clashes)]
-    if num_byes == 0:
-        return bracket_slots
-    _assign_byes(bracket_slots, 0, len(bracket_slots), num_byes)
+    bye_mask = bytearray(num_clashes)
+    _assign_byes(bye_mask, 0, num_clashes, num_byes)
+    return bytes(bye_mask)
+
+
+def generate_first_round_clashes(num_participants):
+    """Generates the minimum number of clashes that fits the amount of
+    competitors.
+
+    Populate the 'byes' (the 'phantom' losers that will pair with competiors
+    that will pass automatically to the next round).
+    """
+    bye_mask = first_round_byes(num_participants)
+    bracket_slots = [Clash() for _ in bye_mask]
+    for clash, is_bye in zip(bracket_slots, bye_mask):
+        if is_bye:
+            clash.is_bye = True
     return bracket_slots
 
 
 def brackets_max_depth_distance(bracket_slots):
     """Returns the number of rounds a competitor must pass to win."""
-    return int(math.log(len(bracket_slots), 2)) + 1
+    return len(bracket_slots).bit_length()
+
+
+def clashes_depth_distance(idx_a, idx_b):
+    """Given two first round clash indices, returns the number of
+    rounds each one must pass to face each other.
+
+    The highest bit that differs between both indices is the level
+    of the smallest subtree that contains both clashes, so it does
+    not need the list of clashes, nor checks the indices.
+    """
+    return (idx_a ^ idx_b).bit_length() + 1
 
 
 def brackets_depth_distance(clashes, idx_a, idx_b):
     """Given two slot indices (each clash has two slots) from the
     first round, returns the number of rounds each one must pass
     to face each other.
+
+    The number of clashes must be a power of two (as returned by
+    `generate_first_round_clashes`).
     """
     n_clashes = len(clashes)
     if idx_a < 0 or idx_a >= n_clashes:
         raise IndexError('idx_a index out of range')
     if idx_b < 0 or idx_b >= n_clashes:
         raise IndexError('idx_b index out of range')
-    if idx_a == idx_b:
-        return 1
-    max_distance = int(math.log(n_clashes, 2)) + 1
-    s = n_clashes // 2
-    while s > 0 and idx_a // s == idx_b // s:
-        max_distance = max_distance - 1
-        s = s // 2
-    return max_distance
+    return (idx_a ^ idx_b).bit_length() + 1
+
+
+@lru_cache(maxsize=8)
+def depth_distance_table(num_clashes):
+    """Returns the `clashes_depth_distance` between all the first
+    round clashes of a bracket with num_clashes (a power of two).
+
+    It is a tuple with a row for each clash, each one an array of
+    unsigned bytes. Tables are cached for the last used bracket sizes,
+    and must not be modified.
+    """
+    return tuple(_depth_distance_row(idx, num_clashes)
+                 for idx in range(num_clashes))
+
+
+def _depth_distance_row(idx, num_clashes):
+    # grow the subtree that contains idx, filling its sibling subtree
+    # at each level with the distance to it
+    row = array('B', [1])
+    level = 0
+    while len(row) < num_clashes:
+        sibling = array('B', [level + 2]) * len(row)
+        if (idx >> level) & 1:
+            row = sibling + row
+        else:
+            row = row + sibling
+        level += 1
+    return row
+
+
+class SubtreeOccupancy(object):
+    """Running count of occupied first round clashes for every subtree
+    of the bracket.
+
+    The counters are stored as a binary tree: node 1 is the whole
+    bracket, and the clash idx is at node idx + n. Marking a clash as
+    occupied, or computing the sum of the `brackets_depth_distance`
+    from a clash to all the occupied ones, only walks the path to the
+    root: O(log n).
+
+    The tree also keeps, for each subtree, the available clash (see
+    `set_available`) with the biggest distance sum, so the farthest
+    available clash is found in O(1).
+    """
+
+    def __init__(self, clashes):
+        """
+        :param clashes: list of first round clashes (its length must
+            be a power of two). Clashes that already have a competitor
+            are marked as occupied.
+        """
+        n_clashes = len(clashes)
+        self.num_clashes = n_clashes
+        self.num_levels = n_clashes.bit_length() - 1
+        self.total = 0
+        self.occupied = bytearray(n_clashes)
+        self.counts = [0] * (2 * n_clashes)
+        # for the available clashes of each subtree: the minimum of
+        # (sum of the counts from the node down to the clash, -idx)
+        self.best = [None] * (2 * n_clashes)
+        for idx, clash in enumerate(clashes):
+            if clash.competitor_a:
+                self.occupy(idx)
+
+    def _pull_path(self, idx):
+        node = (idx + self.num_clashes) // 2
+        counts, best = self.counts, self.best
+        while node > 0:
+            left, right = best[2 * node], best[2 * node + 1]
+            if left is None or (right is not None and right < left):
+                left = right
+            best[node] = None if left is None else \
+                (left[0] + counts[node], left[1])
+            node = node // 2
+
+    def occupy(self, idx):
+        """Marks the clash at idx as occupied (it does nothing if it
+        was already occupied)."""
+        if self.occupied[idx]:
+            return
+        self.occupied[idx] = 1
+        self.total += 1
+        # the count of the whole bracket is kept in total, so the root
+        # count stays 0
+        node = idx + self.num_clashes
+        while node > 1:
+            self.counts[node] += 1
+            node = node // 2
+        node = idx + self.num_clashes
+        if self.best[node] is not None:
+            self.best[node] = (self.counts[node], -idx)
+        self._pull_path(idx)
+
+    def set_available(self, idx, available):
+        """Sets if a clash is available to place competitors (see
+        `farthest_available`)."""
+        node = idx + self.num_clashes
+        self.best[node] = (self.counts[node], -idx) if available else None
+        self._pull_path(idx)
+
+    def distance_sum(self, idx):
+        """Returns the sum of the distances from the clash at idx to
+        every occupied clash.
+
+        Two clashes that join at the level k subtree are k + 1 rounds
+        away (a clash is 1 round away from itself), so it is the sum
+        of (num_levels + 1) for each occupied clash, minus the count
+        of each subtree below the whole bracket that contains idx.
+        """
+        counts = self.counts
+        res = (self.num_levels + 1) * self.total
+        node = idx + self.num_clashes
+        while node > 1:
+            res -= counts[node]
+            node = node // 2
+        return res
+
+    def farthest(self, options):
+        """Returns the option with the biggest distance sum (the last
+        index wins on ties)."""
+        return max((self.distance_sum(idx), idx) for idx in options)[1]
+
+    def farthest_available(self):
+        """Returns the available clash with the biggest distance sum
+        (the last index wins on ties), or None if there is none."""
+        best = self.best[1]
+        return None if best is None else -best[1]
@@ -3,6 +3,8 @@
 class Competitor(object):
     """Competitor information required to place it in a clash."""
 
+    __slots__ = ('name', 'team', 'rating')
+
     def __init__(self, name, team, rating):
         """
         :param name: unique identifier for the competitor
@@ -34,6 +36,10 @@ class Clash(object):
     There are two members that holds the indices for the clases
     where the winner (winnter_to) and the loser (loser_to) advance.
     """
+
+    __slots__ = ('competitor_a', 'competitor_b', 'winner_to', 'loser_to',
+                 'is_bye')
+
     def __init__(self, competitor_a=None, competitor_b=None,
                  winner_to=None, loser_to=None):
         self.competitor_a = competitor_a
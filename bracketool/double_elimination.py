@@ -0,0 +1,292 @@
+"""
+    Double elimination brackets.
+
+    A double elimination bracket has a winners bracket (a single
+    elimination bracket), a losers bracket where the competitors that
+    lose a winners bracket clash get a second chance, and a grand final
+    between the winners of both brackets.
+"""
+
+import random
+import time
+from array import array
+from functools import lru_cache
+
+from bracketool.domain import Clash, ClashGenerator
+from bracketool.pairings import PairingsGenerator
+from bracketool.single_elimination import SingleElimination
+from bracketool.single_elimination import _single_elimination_skeleton
+from bracketool.instrumentation import NULL_INSTRUMENTATION
+
+
+def _drop_rematches(masks, num_rounds, rx, ry):
+    """Returns the losers bracket round where the competitors that lose
+    a winners round rx clash can face again the competitor that beat
+    them, when it drops from winners round ry, and the expected number
+    of those rematches (with every outcome at 50%).
+
+    The loser of winners clash i of round r drops at position i ^ m
+    (m = masks[r], and i // 2 for the first round). Both competitors
+    move up a position level at each drop round, so they are in the
+    same clash once the levels that differ in
+    (masks[rx] >> (ry - rx)) ^ masks[ry] are left behind.
+    """
+    diff = (masks[rx] >> (ry - rx)) ^ masks[ry]
+    drop_round = 2 * ry - 1
+    first_round = 2 * rx - 1 if rx else 0
+    meet = drop_round + 2 * diff.bit_length() - 1 if diff else drop_round
+    # the winner of rx wins ry - rx - 1 clashes and loses one, and then
+    # both win every losers clash until they meet
+    wins = ry - rx + 2 * meet - first_round - drop_round
+    return meet, (1 << (num_rounds - 1 - rx)) / (1 << wins)
+
+
+def _rematches_key(masks, num_rounds, round_pairs, key=None):
+    """Adds the rematches of the (rx, ry) round_pairs to the key: the
+    first round with a rematch (negated) and the expected rematches,
+    so the smallest key is the best."""
+    first, expected = key or (-2 * num_rounds, 0.0)
+    for rx, ry in round_pairs:
+        meet, count = _drop_rematches(masks, num_rounds, rx, ry)
+        first = max(first, -meet)
+        expected += count
+    return first, expected
+
+
+def _spread_loser_drop_masks(num_rounds):
+    """Chooses each mask to make its round drops land in the most
+    distant subtree (the highest differing bit) from the previous
+    rounds drops, delaying the first rematch as much as possible."""
+    aligned = [0]
+    masks = [0]
+    for nr in range(1, num_rounds):
+        best_mask = 0
+        best_score = -1
+        for mask in range(1 << (num_rounds - 1 - nr)):
+            score = min(((mask << nr) ^ prev).bit_length()
+                        for prev in aligned)
+            if score >= best_score:
+                best_mask, best_score = mask, score
+        masks.append(best_mask)
+        aligned.append(best_mask << nr)
+    return masks
+
+
+def _beam_loser_drop_masks(num_rounds, width):
+    """Returns the width best mask lists found choosing the masks round
+    by round, keeping the width best partial lists."""
+    beam = [(None, [0])]
+    for nr in range(1, num_rounds):
+        pairs = [(rx, nr) for rx in range(nr)]
+        candidates = []
+        for key, masks in beam:
+            for mask in range(1 << (num_rounds - 1 - nr)):
+                new_masks = masks + [mask]
+                candidates.append((_rematches_key(new_masks, num_rounds,
+                                                  pairs, key), new_masks))
+        candidates.sort()
+        beam = candidates[:width]
+    return [masks for _, masks in beam]
+
+
+def _improve_loser_drop_masks(masks, num_rounds):
+    """Changes one round mask at a time, while the rematches key gets
+    better."""
+    masks = list(masks)
+    improved = True
+    while improved:
+        improved = False
+        for nr in range(1, num_rounds):
+            others = [(rx, ry) for ry in range(num_rounds)
+                      for rx in range(ry) if nr not in (rx, ry)]
+            own = [(min(rx, nr), max(rx, nr))
+                   for rx in range(num_rounds) if rx != nr]
+            others_key = _rematches_key(masks, num_rounds, others)
+            current = masks[nr]
+            best_key = _rematches_key(masks, num_rounds, own, others_key)
+            for mask in range(1 << (num_rounds - 1 - nr)):
+                masks[nr] = mask
+                key = _rematches_key(masks, num_rounds, own, others_key)
+                if key < best_key:
+                    best_key, current = key, mask
+                    improved = True
+            masks[nr] = current
+    return masks
+
+
+@lru_cache(maxsize=32)
+def _loser_drop_masks(num_rounds):
+    """Returns, for each winners bracket round, the mask to xor with the
+    index of a clash to get the position, in the losers bracket round,
+    where its loser drops (the first round mask is not used).
+
+    Two competitors can only have met in the winners bracket if their
+    clashes are in the same subtree. The masks are searched to make the
+    first possible rematch in the losers bracket as late as possible,
+    and then to have the fewest expected rematches (see
+    `_drop_rematches`): starting from the masks that spread the drops
+    and from a beam search, one mask is changed at a time while the
+    result improves.
+    """
+    starts = [_spread_loser_drop_masks(num_rounds)]
+    starts.extend(_beam_loser_drop_masks(num_rounds, 4))
+    results = [_improve_loser_drop_masks(masks, num_rounds)
+               for masks in starts]
+    return min(results, key=lambda masks: _rematches_key(
+        masks, num_rounds, [(rx, ry) for ry in range(num_rounds)
+                            for rx in range(ry)]))
+
+
+@lru_cache(maxsize=64)
+def _double_elimination_skeleton(num_clashes):
+    """Returns the number of clashes of each winners bracket round, the
+    number of clashes of each losers bracket round, and the `winner_to`
+    and `loser_to` indices for every clash (-1 for None) of a double
+    elimination bracket with num_clashes in the first round.
+
+    Clashes are indexed with the winners bracket rounds first (as in a
+    `SingleElimination`), then the losers bracket rounds, and the grand
+    final last.
+    """
+    w_sizes, w_winner_to, _ = _single_elimination_skeleton(num_clashes)
+    # the losers bracket has two rounds for each winners round after the
+    # first: one where its own winners face each other, and one where
+    # they face the losers dropping from the winners bracket
+    l_sizes = tuple(num_clashes >> (nr // 2 + 1)
+                    for nr in range(2 * len(w_sizes) - 2))
+    w_total = len(w_winner_to)
+    l_begins = [w_total]
+    for size in l_sizes:
+        l_begins.append(l_begins[-1] + size)
+    grand_final = l_begins[-1]
+
+    winner_to = array('i', w_winner_to)
+    winner_to[-1] = grand_final
+    loser_to = array('i')
+    if not l_sizes:
+        loser_to.extend(grand_final for _ in range(w_total))
+    else:
+        loser_to.extend(w_total + nc // 2 for nc in range(num_clashes))
+        masks = _loser_drop_masks(len(w_sizes))
+        for nr in range(1, len(w_sizes)):
+            drop_begin = l_begins[2 * nr - 1]
+            mask = masks[nr]
+            loser_to.extend(drop_begin + (nc ^ mask)
+                            for nc in range(w_sizes[nr]))
+    for nr, size in enumerate(l_sizes):
+        next_begin = l_begins[nr + 1]
+        if nr == len(l_sizes) - 1:
+            winner_to.append(grand_final)
+        elif nr % 2:
+            winner_to.extend(next_begin + nc // 2 for nc in range(size))
+        else:
+            winner_to.extend(next_begin + nc for nc in range(size))
+    winner_to.append(-1)
+    loser_to.extend(-1 for _ in range(len(winner_to) - len(loser_to)))
+    return w_sizes, l_sizes, winner_to, loser_to
+
+
+class DoubleElimination(SingleElimination):
+    """Double elimination bracket.
+
+    `all` holds every clash, and `rounds` every round, in index order:
+    the winners bracket rounds (also in `winners_rounds`), the losers
+    bracket rounds (also in `losers_rounds`), and a last round with the
+    grand final (also in `grand_final`).
+    """
+
+    def __init__(self):
+        super(DoubleElimination, self).__init__()
+        self.winners_rounds = []
+        self.losers_rounds = []
+        self.grand_final = None
+
+
+class DoubleEliminationGen(ClashGenerator):
+    """Creates double elimination brackets."""
+
+    def __init__(self,
+                 use_teams=True,
+                 use_rating=True,
+                 random_seed=None,
+                 instrumentation=None):
+        """
+        :param instrumentation: optional
+            `bracketool.instrumentation.Instrumentation` to measure the
+            generation phases. The report is also stored in the `stats`
+            of the result.
+        """
+        if random_seed is None:
+            random_seed = time.time()
+        self.rnd = random.Random(random_seed)
+        self.use_teams = use_teams
+        self.use_rating = use_rating
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+
+    def _pairings_generator(self):
+        """Creates the first round generator for the next generate call,
+        seeded from this generator."""
+        return PairingsGenerator(use_teams=self.use_teams,
+                                 use_rating=self.use_rating,
+                                 random_seed=self.rnd.randint(0, 1 << 31),
+                                 instrumentation=self.instrumentation)
+
+    def generate(self, competitor_list, team_pairing_count=None,
+                 presorted=False):
+        """Generates the bracket.
+
+        :param presorted: the competitor list is already sorted with
+            `bracketool.loader.sort_for_seeding` (see
+            `PairingsGenerator.generate`).
+        """
+        instr = self.instrumentation
+        instr.start()
+        try:
+            with instr.phase('pairings'):
+                clashes = self._pairings_generator().generate(
+                    competitor_list, team_pairing_count, presorted)
+            with instr.phase('round_wiring'):
+                res = self._wire_rounds(clashes)
+        finally:
+            report = instr.finish()
+        if instr.enabled:
+            res.stats = report
+        return res
+
+    def _wire_rounds(self, clashes):
+        res = DoubleElimination()
+        if not clashes:
+            return res
+        w_sizes, l_sizes, winner_to, loser_to = \
+            _double_elimination_skeleton(len(clashes))
+        res.all.extend(clashes)
+        res.all.extend(Clash() for _ in range(len(winner_to) - len(clashes)))
+        # number of competitors that will reach each clash: the losers
+        # bracket clashes fed by first round byes are byes themselves
+        # (or empty, if none of its competitors exists)
+        incoming = bytearray(len(winner_to))
+        for idx, clash in enumerate(clashes):
+            incoming[idx] = (clash.competitor_a is not None) + \
+                (clash.competitor_b is not None)
+        for idx, clash in enumerate(res.all):
+            to_idx = winner_to[idx]
+            if to_idx >= 0:
+                clash.winner_to = to_idx
+            lose_idx = loser_to[idx]
+            if lose_idx >= 0:
+                clash.loser_to = lose_idx
+            count = incoming[idx]
+            if count == 1 and idx >= len(clashes):
+                clash.is_bye = True
+            if count and to_idx >= 0:
+                incoming[to_idx] += 1
+            if count == 2 and lose_idx >= 0:
+                incoming[lose_idx] += 1
+        begin = 0
+        for size in w_sizes + l_sizes + (1,):
+            res.rounds.append(res.all[begin:begin + size])
+            begin += size
+        res.winners_rounds = res.rounds[:len(w_sizes)]
+        res.losers_rounds = res.rounds[len(w_sizes):-1]
+        res.grand_final = res.all[-1]
+        return res
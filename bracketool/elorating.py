@@ -1,5 +1,10 @@
 import math
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 class EloRating:
     """EloRating has methods to compute ELO ratings after finished clashes.
 
@@ -37,3 +42,78 @@ class EloRating:
         if rating_result_b < 100:
             rating_result_b = 100
         return (rating_result_a, rating_result_b)
+
+
+    def get_k_multipliers( self, num_of_games, max_multiplier = 10.0, stable_number_of_games = 8 ):
+        """
+            Vectorized version of get_k_multiplier.
+
+            num_of_games: NumPy array with the number of games of each player
+        """
+        num_of_games = np.asarray(num_of_games, dtype=np.float64)
+        return np.where(num_of_games >= stable_number_of_games, 1.0,
+                        num_of_games * (1 - max_multiplier)/stable_number_of_games + max_multiplier)
+
+
+    def expected_scores( self, ratings_a, ratings_b ):
+        """
+            Vectorized expected score of A (its probability of winning),
+            as used in calculate_elo_rating.
+
+            ratings_a: NumPy array with the ratings of players A
+            ratings_b: NumPy array with the ratings of players B
+        """
+        return 1 / ( 1 + np.power(10.0, (ratings_b - ratings_a)/400 ) )
+
+
+    def calculate_elo_ratings( self, ratings, num_of_games, idx_a, idx_b, a_won, rounds = None,
+                               k = 32.0, max_multiplier = 10.0, stable_number_of_games = 8 ):
+        """
+            Updates the ratings and number of games of the players for
+            a list of matches, using NumPy.
+
+            Matches of the same round are computed at once, so a player
+            can only appear once in each round. Rounds are computed in
+            order, so the matches must be sorted chronologically.
+
+            The k factor of each player is k multiplied by its
+            get_k_multiplier value before the round.
+
+            ratings: NumPy integer array with the rating of each player
+                (updated in place)
+            num_of_games: NumPy integer array with the number of games
+                played by each player (updated in place)
+            idx_a: array with the index of player A for each match
+            idx_b: array with the index of player B for each match
+            a_won: boolean array indicating if A is the winner of each match
+            rounds: non decreasing array with the round of each match,
+                None if all matches belong to the same round
+        """
+        if np is None:
+            raise ImportError('NumPy is required to calculate ratings in batch')
+        idx_a = np.asarray(idx_a, dtype=np.intp)
+        idx_b = np.asarray(idx_b, dtype=np.intp)
+        result_a = np.asarray(a_won, dtype=np.float64)
+        if rounds is None:
+            bounds = [0, len(idx_a)]
+        else:
+            changes = np.flatnonzero(np.diff(np.asarray(rounds))) + 1
+            bounds = [0] + changes.tolist() + [len(idx_a)]
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            ra = idx_a[begin:end]
+            rb = idx_b[begin:end]
+            players = np.concatenate((ra, rb))
+            if len(np.unique(players)) != len(players):
+                raise ValueError('A player plays more than once in a round')
+            rating_a = ratings[ra].astype(np.float64)
+            rating_b = ratings[rb].astype(np.float64)
+            k_a = k * self.get_k_multipliers(num_of_games[ra], max_multiplier, stable_number_of_games)
+            k_b = k * self.get_k_multipliers(num_of_games[rb], max_multiplier, stable_number_of_games)
+            expected_a = self.expected_scores(rating_a, rating_b)
+            expected_b = 1 - expected_a
+            res_a = result_a[begin:end]
+            res_b = 1 - res_a
+            ratings[ra] = np.maximum(np.trunc(rating_a + k_a * (res_a - expected_a)), 100)
+            ratings[rb] = np.maximum(np.trunc(rating_b + k_b * (res_b - expected_b)), 100)
+            num_of_games[players] += 1
+        return ratings, num_of_games
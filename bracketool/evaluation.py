@@ -0,0 +1,137 @@
+"""Evaluate the quality of the seeding of generated brackets.
+
+Generates the brackets of a category with many random seeds, and
+reports aggregate metrics of the first round:
+
+- top_seeds_meeting_round: earliest round where two of the top rated
+  competitors can meet (higher is better).
+- same_team_clashes: number of first round clashes between members of
+  the same team (lower is better).
+- top_seeds_missing_byes: number of byes that the top rated
+  competitors could hold but do not, min(top competitors, byes) minus
+  the top competitors with a bye (lower is better).
+- top_seeds_byes_imbalance: the biggest difference between the number
+  of top rated competitors with a bye in the two halves of any subtree
+  of the first round (lower is better).
+
+Distances between clashes are read from the cached
+`depth_distance_table`, so metrics are cheap compared to generating
+the brackets, and seeds are spread across a process pool.
+"""
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from bracketool.brackets import depth_distance_table
+from bracketool.single_elimination import SingleEliminationGen
+
+
+METRICS = ('top_seeds_meeting_round', 'same_team_clashes',
+           'top_seeds_missing_byes', 'top_seeds_byes_imbalance')
+
+
+def bracket_metrics(first_round, top_competitors):
+    """Computes the seeding metrics of a first round of clashes.
+
+    :param first_round: list of first round clashes
+    :param top_competitors: the top rated competitors
+
+    :returns: a dict with the value of each one of `METRICS`
+    """
+    top_ids = {id(comp) for comp in top_competitors}
+    top_clashes = []
+    same_team = 0
+    num_byes = 0
+    num_clashes = len(first_round)
+    # number of top competitors with a bye in the subtree of each node
+    # (heap layout, with the clash idx at node idx + num_clashes)
+    top_byes = [0] * (2 * num_clashes)
+    for idx, clash in enumerate(first_round):
+        comps = [comp for comp in (clash.competitor_a, clash.competitor_b)
+                 if comp is not None]
+        top_clashes.extend(idx for comp in comps if id(comp) in top_ids)
+        if clash.is_bye:
+            num_byes += 1
+            if top_clashes and top_clashes[-1] == idx:
+                top_byes[idx + num_clashes] = 1
+        elif len(comps) == 2 and comps[0].team is not None and \
+                comps[0].team == comps[1].team:
+            same_team += 1
+    distances = depth_distance_table(len(first_round)) if first_round \
+        else ()
+    meeting_round = len(first_round).bit_length()
+    for pos, idx_a in enumerate(top_clashes):
+        row = distances[idx_a]
+        for idx_b in top_clashes[pos + 1:]:
+            meeting_round = min(meeting_round, row[idx_b])
+    byes_imbalance = 0
+    for node in range(num_clashes - 1, 0, -1):
+        left, right = top_byes[2 * node], top_byes[2 * node + 1]
+        top_byes[node] = left + right
+        byes_imbalance = max(byes_imbalance, abs(left - right))
+    top_with_bye = top_byes[1] if num_clashes > 1 else sum(top_byes)
+    return {
+        'top_seeds_meeting_round': meeting_round,
+        'same_team_clashes': same_team,
+        'top_seeds_missing_byes': (min(len(top_ids), num_byes) -
+                                   top_with_bye),
+        'top_seeds_byes_imbalance': byes_imbalance,
+    }
+
+
+def _evaluate_seeds(competitors, seeds, top_k, generator_options):
+    top_competitors = sorted(competitors, key=lambda comp: -comp.rating)
+    top_competitors = top_competitors[:top_k]
+    res = []
+    for seed in seeds:
+        gen = SingleEliminationGen(random_seed=seed, **generator_options)
+        bracket = gen.generate(competitors)
+        res.append(bracket_metrics(bracket.rounds[0], top_competitors))
+    return res
+
+
+def evaluate_seeding(competitors, num_seeds=100, top_k=4, first_seed=1,
+                     processes=None, chunk_size=50, **generator_options):
+    """Generates the brackets for a list of competitors with num_seeds
+    different random seeds, and aggregates their seeding metrics.
+
+    :param competitors: list of competitors
+    :param num_seeds: number of brackets to generate, using the seeds
+        from first_seed to first_seed + num_seeds - 1
+    :param top_k: number of top rated competitors to check
+    :param processes: number of worker processes (1 to generate the
+        brackets in this process, None for the number of processors)
+    :param chunk_size: number of seeds evaluated by each worker task
+    :param generator_options: options for `SingleEliminationGen`
+        (use_three_way_final is False by default, as the three way
+        final does not produce a regular bracket).
+
+    :returns: a dict with the 'mean', 'min' and 'max' values of each
+        one of `METRICS`, and a 'top_seeds_meeting_round_count' Counter
+        with the number of brackets for each meeting round.
+    """
+    generator_options.setdefault('use_three_way_final', False)
+    seeds = list(range(first_seed, first_seed + num_seeds))
+    chunks = [seeds[begin:begin + chunk_size]
+              for begin in range(0, len(seeds), chunk_size)]
+    if processes == 1:
+        chunk_results = [_evaluate_seeds(competitors, chunk, top_k,
+                                         generator_options)
+                         for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunk_results = list(executor.map(
+                _evaluate_seeds, [competitors] * len(chunks), chunks,
+                [top_k] * len(chunks), [generator_options] * len(chunks)))
+    results = [metrics for chunk in chunk_results for metrics in chunk]
+    report = {}
+    for metric in METRICS:
+        values = [metrics[metric] for metrics in results]
+        report[metric] = {
+            'mean': sum(values) / len(values) if values else None,
+            'min': min(values, default=None),
+            'max': max(values, default=None),
+        }
+    report['top_seeds_meeting_round_count'] = Counter(
+        metrics['top_seeds_meeting_round'] for metrics in results)
+    return report
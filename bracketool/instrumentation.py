@@ -0,0 +1,149 @@
+"""Optional measurement of the bracket generation phases.
+
+An `Instrumentation` object given to the generators records the wall
+time of each generation phase and the number of calls of the hot path
+operations, and reports them when the generation finishes.
+
+Generators use `NULL_INSTRUMENTATION` by default, whose methods do
+nothing, so disabled instrumentation costs a method call per phase or
+counted operation.
+
+Generations run in worker processes (like the ones of
+`bracketool.batch.generate_categories`) use a `worker` copy of the
+instrumentation without the callback, and their reports are given back
+to the original one with `record`, in the parent process.
+"""
+
+import time
+from collections import Counter, defaultdict
+
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class NullInstrumentation(object):
+    """Instrumentation that does not record anything."""
+
+    enabled = False
+    _phase = _NullPhase()
+
+    def start(self):
+        pass
+
+    def finish(self):
+        return None
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, num=1):
+        pass
+
+    def worker(self):
+        return self
+
+    def record(self, report):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+class _Phase(object):
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.begin = None
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrumentation.timings[self.name] += \
+            time.perf_counter() - self.begin
+        return False
+
+
+class Instrumentation(NullInstrumentation):
+    """Records the wall time of each phase (in seconds), and the count
+    of operations, of a generation.
+
+    Phases:
+
+    - team_reservation: reserving slots for teams
+    - first_round: creating the first round clashes without teams
+    - rating_placement: placing competitors by rating
+    - random_placement: placing competitors randomly
+    - pairings: whole first round generation (`SingleEliminationGen`)
+    - round_wiring: creating and linking the next rounds clashes
+
+    Counts:
+
+    - find_competitor_clash_options: calls to find the clashes where
+      a competitor can be placed
+    - rated_clash_options: clash options rated by distance to the
+      already placed competitors
+    - reserved_team_slots: slots reserved for teams, each one is a
+      query to the team reservation index
+    """
+
+    enabled = True
+
+    def __init__(self, callback=None):
+        """
+        :param callback: optional function called with the report
+            (see `report`) each time a generation finishes.
+        """
+        self.callback = callback
+        self.depth = 0
+        self.timings = defaultdict(float)
+        self.counts = Counter()
+        self.last_report = None
+
+    def start(self):
+        """Starts a generation. Nested generations (like the first round
+        of a `SingleEliminationGen`) are reported with the outer one."""
+        if self.depth == 0:
+            self.timings = defaultdict(float)
+            self.counts = Counter()
+        self.depth += 1
+
+    def finish(self):
+        """Finishes a generation, and returns the report when it is the
+        outer one (None for nested ones)."""
+        self.depth -= 1
+        if self.depth > 0:
+            return None
+        self.record(self.report())
+        return self.last_report
+
+    def worker(self):
+        """Returns a new instrumentation, without callback, to be sent
+        to a worker process."""
+        return Instrumentation()
+
+    def record(self, report):
+        """Records the report of a finished generation (of this
+        instrumentation, or of a `worker` one), calling the callback."""
+        self.last_report = report
+        if self.callback is not None:
+            self.callback(report)
+
+    def phase(self, name):
+        """Returns a context manager that measures a phase."""
+        return _Phase(self, name)
+
+    def count(self, name, num=1):
+        self.counts[name] += num
+
+    def report(self):
+        """Returns a dict with the 'timings' and 'counts' dicts."""
+        return {'timings': dict(self.timings), 'counts': dict(self.counts)}
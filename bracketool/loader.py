@@ -0,0 +1,91 @@
+"""Build the competitor lists of many categories at once.
+
+Competitors are read in a single pass from rows of
+(category, name, team, rating) values, like the columns of a CSV file.
+The rating can also be taken from a rating source (like an
+`EloRatingStore`), using the fourth column as player id.
+
+Each category list is sorted once for seeding, in the same order
+`PairingsGenerator` would sort it, so it can be generated with
+`presorted=True`.
+"""
+
+import csv
+from collections import Counter, OrderedDict
+
+from bracketool.domain import Competitor
+
+
+def seeding_key(team_sizes):
+    """Returns the sort key used to seed the competitors of a category:
+    higher ratings first, and then members of bigger teams (teams with
+    a single competitor count as no team, as their slots are not
+    reserved when seeding by rating).
+
+    :param team_sizes: a Counter with the number of competitors of
+        each team in the category.
+    """
+    def key(comp):
+        size = team_sizes[comp.team] if comp.team is not None else 0
+        return (-comp.rating, -size if size > 1 else 0)
+    return key
+
+
+def sort_for_seeding(competitors):
+    """Returns a new list with the competitors sorted for seeding."""
+    team_sizes = Counter(comp.team for comp in competitors)
+    return sorted(competitors, key=seeding_key(team_sizes))
+
+
+def load_categories(rows, ratings=None):
+    """Builds the sorted competitor lists of each category.
+
+    :param rows: iterable of (category, name, team, rating) tuples.
+        Empty teams ('' or None) are stored as None.
+    :param ratings: optional callable that returns the rating for
+        the value in the fourth column (a player id).
+
+    :returns: an OrderedDict of category to sorted list of competitors,
+        in order of first appearance.
+    """
+    categories = OrderedDict()
+    for category, name, team, rating in rows:
+        if ratings is not None:
+            rating = ratings(rating)
+        competitors = categories.get(category)
+        if competitors is None:
+            competitors = categories[category] = []
+        competitors.append(Competitor(name, team or None, rating))
+    for category, competitors in categories.items():
+        categories[category] = sort_for_seeding(competitors)
+    return categories
+
+
+def load_categories_csv(path, ratings=None, category='category',
+                        name='name', team='team', rating='rating'):
+    """Builds the sorted competitor lists of each category from a CSV
+    file with a header row.
+
+    :param path: path of the CSV file
+    :param ratings: optional callable to get the rating from the
+        value in the rating column (a player id), like
+        `EloRatingStore.rating`. The column value is converted to int
+        first, and used as the rating if not provided.
+    :param category: name of the category column
+    :param name: name of the competitor name column
+    :param team: name of the team column
+    :param rating: name of the rating (or player id) column
+
+    :returns: an OrderedDict of category to sorted list of competitors.
+    """
+    if ratings is None:
+        convert = int
+    else:
+        def convert(player_id):
+            return ratings(int(player_id))
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        return load_categories(
+            ((row[category], row[name], row[team], row[rating])
+             for row in reader),
+            convert)
@@ -0,0 +1,234 @@
+"""Store of the number of times that teams have been paired.
+
+`TeamPairingHistory` can be used everywhere a `team_pairing_count`
+dict is expected: it maps (team_a, team_b) tuples (with team_a None
+for the byes of team_b) to counts. Teams are interned as integer ids,
+and only the pairs with a count are stored, keyed by a single integer
+made of both ids, so a history of many events stays small. It can be
+saved to disk and loaded again for the next events.
+
+`PairingCountOverlay` is a copy on write view of a pairing count
+mapping: reads fall back to the underlying mapping, and writes are
+kept in the overlay until `commit` is called. It is used to make
+tentative pairings (like the team reservations of a bracket) without
+copying the whole history.
+"""
+
+import json
+import struct
+import sys
+from array import array
+from collections.abc import MutableMapping
+
+
+_HEADER = struct.Struct('<8sQQ')
+_MAGIC = b'BKTPAIR1'
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+_NATIVE_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _column_bytes(column):
+    if _NATIVE_LITTLE_ENDIAN:
+        return column.tobytes()
+    column = array(column.typecode, column)
+    column.byteswap()
+    return column.tobytes()
+
+
+def _pair_order(team_a, team_b):
+    """Returns the pair in the order used by team_pairing_count."""
+    if team_a is None or (team_b is not None and team_a <= team_b):
+        return team_a, team_b
+    return team_b, team_a
+
+
+class TeamPairingHistory(MutableMapping):
+    """Counts of team pairings, with interned team ids.
+
+    Setting a count to 0 removes the pair.
+    """
+
+    def __init__(self, pairing_count=None):
+        """
+        :param pairing_count: optional mapping (like a
+            team_pairing_count dict) with the initial counts.
+        """
+        # id 0 is None (the bye)
+        self._teams = [None]
+        self._ids = {None: 0}
+        self._counts = {}
+        if pairing_count:
+            self.update(pairing_count)
+
+    def team_id(self, team):
+        """Returns the interned id of a team, adding it if needed."""
+        team_id = self._ids.get(team)
+        if team_id is None:
+            team_id = self._ids[team] = len(self._teams)
+            self._teams.append(team)
+        return team_id
+
+    def _key(self, pair):
+        id_a = self._ids.get(pair[0])
+        id_b = self._ids.get(pair[1])
+        if id_a is None or id_b is None:
+            return None
+        if id_a > id_b:
+            id_a, id_b = id_b, id_a
+        return (id_a << _ID_BITS) | id_b
+
+    def _pair(self, key):
+        return _pair_order(self._teams[key >> _ID_BITS],
+                           self._teams[key & _ID_MASK])
+
+    def get(self, pair, default=None):
+        key = self._key(pair)
+        if key is None:
+            return default
+        return self._counts.get(key, default)
+
+    def __getitem__(self, pair):
+        key = self._key(pair)
+        if key is None or key not in self._counts:
+            raise KeyError(pair)
+        return self._counts[key]
+
+    def __setitem__(self, pair, count):
+        id_a = self.team_id(pair[0])
+        id_b = self.team_id(pair[1])
+        if id_a > id_b:
+            id_a, id_b = id_b, id_a
+        key = (id_a << _ID_BITS) | id_b
+        if count:
+            self._counts[key] = count
+        else:
+            self._counts.pop(key, None)
+
+    def __delitem__(self, pair):
+        key = self._key(pair)
+        if key is None or key not in self._counts:
+            raise KeyError(pair)
+        del self._counts[key]
+
+    def __contains__(self, pair):
+        key = self._key(pair)
+        return key is not None and key in self._counts
+
+    def __iter__(self):
+        for key in self._counts:
+            yield self._pair(key)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def items(self):
+        return [(self._pair(key), count)
+                for key, count in self._counts.items()]
+
+    def overlay(self):
+        """Returns a `PairingCountOverlay` of this history."""
+        return PairingCountOverlay(self)
+
+    def save(self, path):
+        """Writes the history to a file. Teams must be JSON serializable
+        (strings or numbers)."""
+        teams = json.dumps(self._teams[1:]).encode('utf-8')
+        keys = array('Q', self._counts.keys())
+        counts = array('q', self._counts.values())
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, len(teams), len(keys)))
+            f.write(teams)
+            f.write(_column_bytes(keys))
+            f.write(_column_bytes(counts))
+
+    @classmethod
+    def load(cls, path):
+        """Reads a history written with `save`."""
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError('{} is not a pairing history'.format(path))
+            magic, teams_size, num_pairs = _HEADER.unpack(header)
+            if magic != _MAGIC:
+                raise ValueError('{} is not a pairing history'.format(path))
+            teams = json.loads(f.read(teams_size).decode('utf-8'))
+            keys = array('Q')
+            counts = array('q')
+            for column in (keys, counts):
+                column.fromfile(f, num_pairs)
+                if not _NATIVE_LITTLE_ENDIAN:
+                    column.byteswap()
+        res = cls()
+        for team in teams:
+            res.team_id(team)
+        res._counts = dict(zip(keys, counts))
+        return res
+
+
+class PairingCountOverlay(MutableMapping):
+    """Copy on write view of a pairing count mapping (a dict, a
+    `TeamPairingHistory` or another overlay).
+
+    The underlying mapping is not modified until `commit` is called.
+    Creating an overlay does not copy anything, and it only stores the
+    pairs that are written to it.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        # pair -> count written in the overlay (0 for removed pairs)
+        self.changes = {}
+
+    def get(self, pair, default=None):
+        count = self.changes.get(pair)
+        if count is None:
+            return self.base.get(pair, default)
+        return count if count else default
+
+    def __getitem__(self, pair):
+        count = self.get(pair)
+        if count is None:
+            raise KeyError(pair)
+        return count
+
+    def __setitem__(self, pair, count):
+        self.changes[pair] = count
+
+    def setdefault(self, pair, default=None):
+        count = self.get(pair)
+        if count is None:
+            self.changes[pair] = count = default
+        return count
+
+    def __delitem__(self, pair):
+        if pair not in self:
+            raise KeyError(pair)
+        self.changes[pair] = 0
+
+    def __contains__(self, pair):
+        return self.get(pair) is not None
+
+    def __iter__(self):
+        for pair in self.base:
+            if pair not in self.changes:
+                yield pair
+        for pair, count in self.changes.items():
+            if count:
+                yield pair
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def overlay(self):
+        return PairingCountOverlay(self)
+
+    def commit(self):
+        """Writes the changes to the underlying mapping, and clears
+        them."""
+        for pair, count in self.changes.items():
+            if count:
+                self.base[pair] = count
+            else:
+                self.base.pop(pair, None)
+        self.changes = {}
@@ -7,24 +7,128 @@ import math
 import random
 import time
 
-from bracketool.brackets import brackets_depth_distance
 from bracketool.brackets import generate_first_round_clashes
+from bracketool.brackets import SubtreeOccupancy
 from bracketool.domain import Clash, ClashGenerator
 from bracketool.teambrackets import clashes_team_count
 from bracketool.teambrackets import create_reserved_teams_bracket_clashes
+from bracketool import vectorized
+from bracketool.instrumentation import NULL_INSTRUMENTATION
+
+
+class ReservationState(object):
+    """Keeps track of the clashes where competitors can be placed.
+
+    It holds the number of pending reservations of each team, the open
+    clashes (with a spot left) reserved for each team, and the free
+    clashes (where a competitor without reservation can be placed).
+    `update` refreshes them after a competitor is placed in a clash,
+    so the options for a competitor are found without checking every
+    clash.
+
+    If an occupancy index is given, the free clashes are marked as
+    available in it, so the farthest free clash can be queried.
+    """
+
+    def __init__(self, clashes, reservations, occupancy=None):
+        self.clashes = clashes
+        self.reservations = reservations
+        self.occupancy = occupancy
+        self.team_count = clashes_team_count(reservations)
+        self.team_clashes = {}
+        self.free = set()
+        for idx in range(len(clashes)):
+            self.update(idx)
+
+    def _is_free(self, idx):
+        reserv = self.reservations[idx]
+        clash = self.clashes[idx]
+        if len(reserv) == 2:
+            # skip full reseved
+            return False
+        elif len(reserv) == 1:
+            # skip if there is one reservation, and only one spot left
+            if clash.is_bye or clash.competitor_a is not None:
+                return False
+        return clash.has_spot()
+
+    def update(self, idx, removed_team=None):
+        """Refreshes the state of a clash.
+
+        :param idx: the clash index
+        :param removed_team: the team whose reservation was removed
+            from the clash (when one of its members was placed there)
+        """
+        reserv = self.reservations[idx]
+        has_spot = self.clashes[idx].has_spot()
+        teams = set(reserv)
+        if removed_team is not None:
+            teams.add(removed_team)
+            self.team_count[removed_team] -= 1
+            if self.team_count[removed_team] <= 0:
+                del self.team_count[removed_team]
+        for team in teams:
+            team_clashes = self.team_clashes.setdefault(team, set())
+            if has_spot and team in reserv:
+                team_clashes.add(idx)
+            else:
+                team_clashes.discard(idx)
+        is_free = self._is_free(idx)
+        if is_free:
+            self.free.add(idx)
+        else:
+            self.free.discard(idx)
+        if self.occupancy is not None:
+            self.occupancy.set_available(idx, is_free)
+
+    def reserved_options(self, team):
+        """Returns the sorted clash indices reserved for the team that
+        still have a spot (an empty list if there are none)."""
+        if team in self.team_count:
+            options = self.team_clashes.get(team)
+            if options:
+                return sorted(options)
+        return []
+
+    def options(self, team):
+        """Returns the sorted clash indices where a member of the team
+        can be placed: the ones reserved for the team, or if there are
+        none, the free ones."""
+        return self.reserved_options(team) or sorted(self.free)
 
 
 class PairingsGenerator(object):
     """Creates single elimination brackets."""
 
-    def __init__(self, use_teams=True, use_rating=True, random_seed=None):
+    def __init__(self, use_teams=True, use_rating=True, random_seed=None,
+                 use_numpy=False, instrumentation=None, split_cutoff=None,
+                 reservation_processes=1):
+        """
+        :param use_numpy: rate the clashes with the NumPy backend (see
+            `bracketool.vectorized`). Falls back to the pure python one
+            if NumPy is not installed. Brackets are the same with both.
+        :param instrumentation: optional
+            `bracketool.instrumentation.Instrumentation` to measure the
+            generation phases.
+        :param split_cutoff: reserve the team slots dividing the bracket
+            in subtrees of at most this number of first round clashes
+            (see `bracketool.teambrackets.reserve_team_slots_split`).
+        :param reservation_processes: number of worker processes for
+            the subtrees reservation (None for the number of
+            processors).
+        """
         if not random_seed:
             random_seed = time.time()
         self.rnd = random.Random(random_seed)
         self.use_teams = use_teams
         self.use_rating = use_rating
+        self.use_numpy = use_numpy and vectorized.numpy_available()
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        self.split_cutoff = split_cutoff
+        self.reservation_processes = reservation_processes
 
-    def _find_competitor_clash_options(self, competitor, reservations, clashes):
+    def _find_competitor_clash_options(self, competitor, reservations,
+                                       clashes, state=None):
         """Find the available clash options for a competitor, based on
         reservations made for a team.
 
@@ -35,40 +139,29 @@ class PairingsGenerator(object):
             first round clashes.
             If there are no reservations, it MUST be a list of empty lists.
         :param clashes: List of Clashes for the all the rounds.
+        :param state: the `ReservationState` of the clashes (a new one
+            is created if not provided).
 
         :returns: a list of indices where a competitor can be placed.
         """
-        options = []
-        # find if we have reserved spots for this team:
-        team_count = clashes_team_count(reservations)
-        if competitor.team in team_count:
-            for idx, reserv in enumerate(reservations):
-                if competitor.team in reserv and clashes[idx].has_spot():
-                    options.append(idx)
-            if options:
-                return options
-        # if we could not find a reserved spot, use a free spot
-        for idx, reserv in enumerate(reservations):
-            if len(reserv) == 2:
-                # skip full reseved
-                continue
-            elif len(reserv) == 1:
-                # skip if there is one reservation, and only one spot left
-                if clashes[idx].is_bye:
-                    continue
-                if clashes[idx].competitor_a is not None:
-                    continue
-            if clashes[idx].has_spot():
-                options.append(idx)
-        return options
+        self.instrumentation.count('find_competitor_clash_options')
+        if state is None:
+            state = ReservationState(clashes, reservations)
+        return state.options(competitor.team)
 
     def _assign_clash(self, competitor, clashes, clash_idx, reservations,
-                      team_pairing_count):
+                      team_pairing_count, occupancy=None, state=None):
         clash = clashes[clash_idx]
         clash.add_competitor(competitor)
+        if occupancy is not None:
+            occupancy.occupy(clash_idx)
+        removed_team = None
         if reservations and competitor.team in reservations[clash_idx]:
             # remove the reservations, because we are assigning it
             reservations[clash_idx].remove(competitor.team)
+            removed_team = competitor.team
+        if state is not None:
+            state.update(clash_idx, removed_team)
         if not clash.has_spot() and not clash.is_bye and \
                 team_pairing_count is not None:
             team_a = clash.competitor_a.team
@@ -78,38 +171,51 @@ class PairingsGenerator(object):
                 cnt = team_pairing_count.setdefault(pt, 0) + 1
                 team_pairing_count[pt] = cnt
 
-    def _further_from_others(self, options, clashes):
-        opt_distances = []
-        for opt_idx in options:
-            opt_distances.append(
-                (sum([brackets_depth_distance(clashes, opt_idx, cl_idx)
-                      for cl_idx in range(len(clashes))
-                      if clashes[cl_idx].competitor_a]
-                     ),
-                 opt_idx)
-            )
-        opt_distances.sort()
-        return opt_distances[-1][1]
+    def _further_from_others(self, options, occupancy):
+        """Returns the option with the biggest sum of distances to the
+        occupied clashes (the last index wins on ties).
+
+        :param options: list of clash indices
+        :param occupancy: `SubtreeOccupancy` (or its NumPy version) for
+            the first round clashes
+        """
+        self.instrumentation.count('rated_clash_options', len(options))
+        return occupancy.farthest(options)
 
     def _assign_by_rating(self, clashes, competitor_list, reservations,
-                          team_pairing_count):
+                          team_pairing_count, presorted=False):
         """Sort competitors by rating, and tries to put them as separate
         as possible, respecting team.
+
+        :param presorted: the competitor list is already sorted (see
+            `bracketool.loader.sort_for_seeding`)
         """
-        # TODO: do we really need team count for something ?:
-        team_count = clashes_team_count(reservations)
-        sorted_clist = sorted(
-                competitor_list,
-                key=lambda comp: (-comp.rating, -team_count[comp.team]))
+        if self.use_numpy:
+            occupancy = vectorized.NumpySubtreeOccupancy(clashes)
+        else:
+            occupancy = SubtreeOccupancy(clashes)
+        state = ReservationState(clashes, reservations, occupancy)
+        if presorted:
+            sorted_clist = competitor_list
+        else:
+            # TODO: do we really need team count for something ?:
+            team_count = state.team_count
+            sorted_clist = sorted(
+                    competitor_list,
+                    key=lambda comp: (-comp.rating, -team_count[comp.team]))
         for idx, comp in enumerate(sorted_clist):
-            options = self._find_competitor_clash_options(
-                    comp, reservations, clashes)
-            if not options:
+            self.instrumentation.count('find_competitor_clash_options')
+            options = state.reserved_options(comp.team)
+            if options:
+                f_idx = self._further_from_others(options, occupancy)
+            else:
+                # the free clash index is kept by the occupancy
+                f_idx = occupancy.farthest_available()
+            if f_idx is None:
                 # TODO: Should we raise an exception?
                 continue
-            f_idx = self._further_from_others(options, clashes)
-            self._assign_clash(comp, clashes, f_idx,
-                               reservations, team_pairing_count)
+            self._assign_clash(comp, clashes, f_idx, reservations,
+                               team_pairing_count, occupancy, state)
             # This would be the naive option of alternating :
             # cheaper in computing costs but less fair
             #self._assign_clash(comp, clashes, options[-(idx % 2)],
@@ -117,29 +223,59 @@ class PairingsGenerator(object):
 
     def _assign_by_random(self, clashes, competitor_list, reservations,
                           team_pairing_count):
+        state = ReservationState(clashes, reservations)
         for idx, comp in enumerate(competitor_list):
             options = self._find_competitor_clash_options(
-                    comp, reservations, clashes)
+                    comp, reservations, clashes, state)
             self._assign_clash(comp, clashes, self.rnd.choice(options),
-                               reservations, team_pairing_count)
+                               reservations, team_pairing_count, None, state)
+
+    def generate(self, competitor_list, team_pairing_count=None,
+                 presorted=False):
+        """Creates the first round clashes.
+
+        :param competitor_list: list of competitors
+        :param team_pairing_count: dict counting the times that two
+            teams have been paired, updated with the new pairings.
+        :param presorted: set it to True if the competitor list is
+            already sorted with `bracketool.loader.sort_for_seeding`,
+            to skip sorting it again when using the rating.
+        """
+        instr = self.instrumentation
+        instr.start()
+        try:
+            return self._generate(competitor_list, team_pairing_count,
+                                  presorted)
+        finally:
+            instr.finish()
 
-    def generate(self, competitor_list, team_pairing_count=None):
+    def _generate(self, competitor_list, team_pairing_count, presorted):
         if team_pairing_count is None:
             team_paiting_count = dict()
+        instr = self.instrumentation
         assign_single_competitor_teams = not self.use_rating
         if self.use_teams:
-            clashes, reservations = create_reserved_teams_bracket_clashes(
-                competitor_list, team_pairing_count, rnd=self.rnd,
-                assign_single_competitor_teams=assign_single_competitor_teams)
+            with instr.phase('team_reservation'):
+                clashes, reservations = create_reserved_teams_bracket_clashes(
+                    competitor_list, team_pairing_count, rnd=self.rnd,
+                    assign_single_competitor_teams=(
+                        assign_single_competitor_teams),
+                    use_numpy=self.use_numpy,
+                    split_cutoff=self.split_cutoff,
+                    processes=self.reservation_processes)
+            instr.count('reserved_team_slots', sum(map(len, reservations)))
         else:
-            clashes = generate_first_round_clashes(len(competitor_list))
-            reservations = [list() for _ in clashes]
+            with instr.phase('first_round'):
+                clashes = generate_first_round_clashes(len(competitor_list))
+                reservations = [list() for _ in clashes]
         if not clashes:
             return clashes
         if self.use_rating:
-            self._assign_by_rating(clashes, competitor_list, reservations,
-                                   team_pairing_count)
+            with instr.phase('rating_placement'):
+                self._assign_by_rating(clashes, competitor_list, reservations,
+                                       team_pairing_count, presorted)
         else:
-            self._assign_by_random(clashes, competitor_list, reservations,
-                                   team_pairing_count)
+            with instr.phase('random_placement'):
+                self._assign_by_random(clashes, competitor_list, reservations,
+                                       team_pairing_count)
         return clashes
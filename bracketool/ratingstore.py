@@ -0,0 +1,171 @@
+"""Persistent store of Elo ratings.
+
+The players table lives in a memory mapped file, so opening a store
+is immediate and memory usage does not depend on the number of
+players: only the touched pages are loaded.
+
+The file has a fixed size header and an open addressing hash table
+of fixed width records (player id, rating, number of games), indexed
+by player id with linear probing. Player ids are non negative
+integers (like license numbers).
+"""
+
+import mmap
+import struct
+
+from bracketool.elorating import EloRating
+
+
+_HEADER = struct.Struct('<8sQQ')
+_RECORD = struct.Struct('<qiI')
+_MAGIC = b'BKTELO01'
+_EMPTY = -1
+_MAX_LOAD = 0.7
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+class EloRatingStore(object):
+    """Memory mapped table of player ratings and number of games,
+    updated in place from match results.
+    """
+
+    def __init__(self, path, elo_rating=None, initial_rating=1500, k=32.0):
+        """Opens an existing store (see `create`).
+
+        :param path: path of the store file
+        :param elo_rating: the `EloRating` used to compute new ratings
+        :param initial_rating: rating for players without previous games
+        :param k: k factor, multiplied by `EloRating.get_k_multiplier`
+            for each player
+        """
+        self.elo_rating = elo_rating or EloRating()
+        self.initial_rating = initial_rating
+        self.k = k
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, capacity, count = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError('{} is not a rating store'.format(path))
+        self.capacity = capacity
+        self.count = count
+        self._shift = 64 - (capacity.bit_length() - 1)
+
+    @classmethod
+    def create(cls, path, max_players, **kwargs):
+        """Creates an empty store file and opens it.
+
+        :param max_players: number of players the store must be able
+            to hold (the table is sized so it is at most 70% full).
+        """
+        capacity = 1 << max(int(max_players / _MAX_LOAD), 1).bit_length()
+        empty = _RECORD.pack(_EMPTY, 0, 0)
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, capacity, 0))
+            chunk = empty * min(capacity, 65536)
+            remaining = capacity
+            while remaining > 0:
+                n = min(remaining, 65536)
+                f.write(chunk[:n * _RECORD.size])
+                remaining -= n
+        return cls(path, **kwargs)
+
+    def _find_slot(self, player_id):
+        """Returns the offset of the player record, or of the empty
+        slot where it would be inserted."""
+        if player_id < 0:
+            raise ValueError('player ids must be non negative integers')
+        mask = self.capacity - 1
+        slot = ((player_id * _HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> \
+            self._shift
+        while True:
+            offset = _HEADER.size + slot * _RECORD.size
+            stored_id = _RECORD.unpack_from(self._map, offset)[0]
+            if stored_id == player_id or stored_id == _EMPTY:
+                return offset
+            slot = (slot + 1) & mask
+
+    def _player_offset(self, player_id):
+        offset = self._find_slot(player_id)
+        if _RECORD.unpack_from(self._map, offset)[0] == _EMPTY:
+            if self.count + 1 > self.capacity * _MAX_LOAD:
+                raise ValueError('rating store is full')
+            _RECORD.pack_into(self._map, offset, player_id,
+                              self.initial_rating, 0)
+            self.count += 1
+            _HEADER.pack_into(self._map, 0, _MAGIC, self.capacity,
+                              self.count)
+        return offset
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, player_id):
+        offset = self._find_slot(player_id)
+        return _RECORD.unpack_from(self._map, offset)[0] != _EMPTY
+
+    def get(self, player_id):
+        """Returns (rating, number of games) for a player, or None if
+        the player is not in the store."""
+        stored_id, rating, games = _RECORD.unpack_from(
+            self._map, self._find_slot(player_id))
+        if stored_id == _EMPTY:
+            return None
+        return rating, games
+
+    def rating(self, player_id):
+        """Returns the rating of a player, or the initial rating if
+        the player is not in the store."""
+        res = self.get(player_id)
+        return self.initial_rating if res is None else res[0]
+
+    def record(self, player_a, player_b, a_won):
+        """Updates the ratings of both players with the result of a
+        match. Players not in the store are added with the initial
+        rating.
+
+        :returns: the new ratings of A and B
+        """
+        offset_a = self._player_offset(player_a)
+        offset_b = self._player_offset(player_b)
+        _, rating_a, games_a = _RECORD.unpack_from(self._map, offset_a)
+        _, rating_b, games_b = _RECORD.unpack_from(self._map, offset_b)
+        elo = self.elo_rating
+        rating_a, rating_b = elo.calculate_elo_rating(
+            rating_a, rating_b, a_won,
+            self.k * elo.get_k_multiplier(games_a),
+            self.k * elo.get_k_multiplier(games_b))
+        _RECORD.pack_into(self._map, offset_a, player_a, rating_a,
+                          games_a + 1)
+        _RECORD.pack_into(self._map, offset_b, player_b, rating_b,
+                          games_b + 1)
+        return rating_a, rating_b
+
+    def consume(self, results):
+        """Records the results from an iterable of
+        (player_a, player_b, a_won) tuples, in order.
+
+        :returns: the number of recorded results
+        """
+        count = 0
+        for player_a, player_b, a_won in results:
+            self.record(player_a, player_b, a_won)
+            count += 1
+        return count
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
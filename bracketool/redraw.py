@@ -0,0 +1,275 @@
+"""Update a generated first round when a competitor withdraws or
+registers late, instead of generating it again.
+
+A withdrawal turns the clash of the competitor into a bye. If the
+competitor had a bye, a competitor of the nearest clash with two
+competitors (in the smallest subtree that has one) takes the empty
+clash. A late entry takes the place of the bye that is farthest from
+its team mates. The bracket grows to the next power of two when there
+are no byes left, and halves as soon as the competitors fit in half
+the clashes, so it always has the size of a new draw. Both keep the
+competitors that would meet in the next round.
+"""
+
+from bracketool.brackets import clashes_depth_distance
+from bracketool.domain import Clash
+
+
+def _nearest_index(idx, size, accept):
+    """Returns the index accepted by the function in the smallest
+    subtree around idx that has one (of a heap ordered list of the
+    given power of two size), or None."""
+    level = 0
+    while (1 << level) < size:
+        # the other half of the subtree of the next level
+        begin = ((idx >> level) ^ 1) << level
+        for other in range(begin, begin + (1 << level)):
+            if accept(other):
+                return other
+        level += 1
+    return None
+
+
+class FirstRoundEditor(object):
+    """Adds and removes competitors of a first round (like the one
+    returned by `PairingsGenerator.generate`), updating it in place.
+    """
+
+    def __init__(self, clashes, reservations=None, team_pairing_count=None):
+        """
+        :param clashes: list of first round clashes
+        :param reservations: the team reservations of each clash (see
+            `create_reserved_teams_bracket_clashes`). A late competitor
+            takes a reserved spot of its team if there is one left.
+            The list is kept aligned with the clashes.
+        :param team_pairing_count: dict counting the times that two
+            teams have been paired, updated with the pairings that are
+            created and removed.
+        """
+        self.clashes = clashes
+        self.reservations = reservations
+        self.team_pairing_count = team_pairing_count
+        self._build_index()
+
+    def _build_index(self):
+        # clash index of each competitor, clash indices of the members
+        # of each team, the bye clashes, and the clashes with a spot
+        # reserved for each team
+        self._clash_idx = {}
+        self._team_clashes = {}
+        self._byes = set()
+        self._reserved = {}
+        for idx, clash in enumerate(self.clashes):
+            for comp in (clash.competitor_a, clash.competitor_b):
+                if comp is not None:
+                    self._place(comp, idx)
+            if clash.is_bye:
+                self._byes.add(idx)
+            if self.reservations is not None:
+                for team in self.reservations[idx]:
+                    self._reserved.setdefault(team, set()).add(idx)
+
+    def _place(self, competitor, idx):
+        self._clash_idx[id(competitor)] = idx
+        if competitor.team is not None:
+            self._team_clashes.setdefault(competitor.team, []).append(idx)
+
+    def _unplace(self, competitor):
+        idx = self._clash_idx.pop(id(competitor))
+        if competitor.team is not None:
+            self._team_clashes[competitor.team].remove(idx)
+        return idx
+
+    def _count_pairing(self, clash, delta):
+        if self.team_pairing_count is None or clash.is_bye or \
+                clash.competitor_a is None or clash.competitor_b is None:
+            return
+        team_a = clash.competitor_a.team
+        team_b = clash.competitor_b.team
+        if team_a and team_b:
+            pt = (min(team_a, team_b), max(team_a, team_b))
+            cnt = self.team_pairing_count.get(pt, 0) + delta
+            if cnt > 0:
+                self.team_pairing_count[pt] = cnt
+            else:
+                self.team_pairing_count.pop(pt, None)
+
+    def clash_index(self, competitor):
+        """Returns the index of the clash of the competitor."""
+        try:
+            return self._clash_idx[id(competitor)]
+        except KeyError:
+            raise ValueError('{} is not in the first round'.format(
+                competitor))
+
+    def remove(self, competitor):
+        """Removes a competitor from the first round.
+
+        :returns: the indices of the changed clashes (all of them, if
+            the bracket is halved)
+        """
+        idx = self.clash_index(competitor)
+        self._unplace(competitor)
+        clash = self.clashes[idx]
+        if not clash.is_bye:
+            self._count_pairing(clash, -1)
+            if clash.competitor_a is competitor:
+                clash.competitor_a = clash.competitor_b
+            clash.competitor_b = None
+            # a clash with an open spot is left empty
+            clash.is_bye = clash.competitor_a is not None
+            if clash.is_bye:
+                self._byes.add(idx)
+            changed = [idx]
+        else:
+            clash.competitor_a = None
+            clash.is_bye = False
+            self._byes.discard(idx)
+            changed = [idx]
+            donor_idx = self._nearest_full_clash(idx)
+            if donor_idx is not None:
+                donor = self.clashes[donor_idx]
+                self._count_pairing(donor, -1)
+                moved = donor.competitor_b
+                donor.competitor_b = None
+                donor.is_bye = True
+                self._byes.add(donor_idx)
+                self._unplace(moved)
+                clash.competitor_a = moved
+                clash.is_bye = True
+                self._byes.add(idx)
+                self._place(moved, idx)
+                changed.append(donor_idx)
+        if self._fits_in_half():
+            return self._shrink()
+        return changed
+
+    def _fits_in_half(self):
+        """The competitors fit in half the clashes (a single competitor
+        keeps its bye)."""
+        num_clashes = len(self.clashes)
+        num_competitors = len(self._clash_idx)
+        if num_clashes < 2:
+            return num_clashes == 1 and not num_competitors
+        return num_competitors <= num_clashes
+
+    def _nearest_full_clash(self, idx):
+        """Returns the index of a clash with two competitors in the
+        smallest subtree around idx that has one, or None."""
+        def is_full(other):
+            clash = self.clashes[other]
+            return not clash.is_bye and clash.competitor_b is not None
+        return _nearest_index(idx, len(self.clashes), is_full)
+
+    def _shrink(self):
+        """Halves the first round until the competitors do not fit in
+        half the clashes: the competitors of each pair of clashes, that
+        would meet in the second round, face each other. When a pair
+        has more than two, the clash with two competitors is kept, and
+        the rest move to the nearest pair with room."""
+        while self._fits_in_half():
+            groups = []
+            for idx in range(0, len(self.clashes) - 1, 2):
+                group = []
+                # full clashes first (the sort is stable)
+                for clash in sorted(self.clashes[idx:idx + 2],
+                                    key=lambda clash: clash.is_bye or
+                                    clash.competitor_b is None):
+                    self._count_pairing(clash, -1)
+                    group.extend(comp for comp in (clash.competitor_a,
+                                                   clash.competitor_b)
+                                 if comp is not None)
+                groups.append(group)
+            for idx, group in enumerate(groups):
+                while len(group) > 2:
+                    other = _nearest_index(
+                        idx, len(groups),
+                        lambda other: len(groups[other]) < 2)
+                    groups[other].append(group.pop())
+            new_clashes = []
+            for group in groups:
+                clash = Clash(*group)
+                clash.is_bye = len(group) == 1
+                self._count_pairing(clash, 1)
+                new_clashes.append(clash)
+            self.clashes[:] = new_clashes
+            if self.reservations is not None:
+                self.reservations[:] = [
+                    self.reservations[idx] + self.reservations[idx + 1]
+                    for idx in range(0, len(self.reservations) - 1, 2)]
+            self._build_index()
+        return list(range(len(self.clashes)))
+
+    def _grow(self):
+        """Doubles the first round (when there are no byes): each
+        clash is split in two byes, so its competitors would meet in
+        the second round."""
+        new_clashes = []
+        for clash in self.clashes:
+            self._count_pairing(clash, -1)
+            for comp in (clash.competitor_a, clash.competitor_b):
+                bye = Clash(comp)
+                bye.is_bye = True
+                new_clashes.append(bye)
+        self.clashes[:] = new_clashes
+        if self.reservations is not None:
+            self.reservations[:] = [
+                reserv[pos:pos + 1] if pos == 0 else reserv[pos:]
+                for reserv in self.reservations for pos in (0, 1)]
+        self._build_index()
+
+    def _reserved_clash(self, team):
+        for idx in sorted(self._reserved.get(team, ())):
+            if self.clashes[idx].has_spot():
+                return idx
+        return None
+
+    def _team_distance_key(self, team, idx):
+        """Sort key of a clash for a member of the team: the farthest
+        from its team mates is the biggest."""
+        team_clashes = self._team_clashes.get(team)
+        if not team_clashes:
+            return (0, 0)
+        distances = [clashes_depth_distance(idx, other)
+                     for other in team_clashes]
+        return (min(distances), sum(distances))
+
+    def add(self, competitor):
+        """Adds a competitor to the first round.
+
+        It takes a spot reserved for its team, or else the bye that is
+        farthest from its team mates (and, on ties, the one of the
+        lowest rated competitor).
+
+        :returns: the indices of the changed clashes (all of them, if
+            the bracket is doubled)
+        """
+        if not self.clashes:
+            clash = Clash(competitor)
+            clash.is_bye = True
+            self.clashes.append(clash)
+            if self.reservations is not None:
+                self.reservations.append([])
+            self._place(competitor, 0)
+            self._byes.add(0)
+            return [0]
+        resized = False
+        idx = self._reserved_clash(competitor.team)
+        if idx is not None:
+            self.reservations[idx].remove(competitor.team)
+            if competitor.team not in self.reservations[idx]:
+                self._reserved[competitor.team].discard(idx)
+        else:
+            if not self._byes:
+                self._grow()
+                resized = True
+            idx = max(self._byes, key=lambda idx: (
+                self._team_distance_key(competitor.team, idx),
+                -self.clashes[idx].competitor_a.rating, idx))
+        clash = self.clashes[idx]
+        clash.is_bye = False
+        self._byes.discard(idx)
+        clash.add_competitor(competitor)
+        self._count_pairing(clash, 1)
+        self._place(competitor, idx)
+        return list(range(len(self.clashes))) if resized else [idx]
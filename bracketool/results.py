@@ -0,0 +1,129 @@
+"""Record the outcomes of the clashes of a bracket.
+
+`BracketResults` keeps track of which clashes are ready to be fought
+(both competitors known), and moves the winners (and losers, for
+brackets that use `loser_to`) to their next clash when a result is
+recorded.
+"""
+
+from collections import deque
+
+
+class BracketResults(object):
+    """Results of a generated bracket.
+
+    The competitors are placed in the clashes of the bracket as the
+    results are recorded, so the bracket structure always shows the
+    current state of the competition.
+
+    Byes are resolved automatically: the competitor of a bye clash is
+    moved forward as soon as it is known.
+
+    Each competitor takes the slot of the clash it comes from (the
+    empty slots of a clash are given to its feeder clashes in index
+    order), so the bracket looks the same whatever the order in which
+    the results are recorded.
+    """
+
+    def __init__(self, bracket):
+        """
+        :param bracket: a bracket with the list of clashes in `all`
+            (like `SingleElimination`), with first round competitors
+            already assigned.
+        """
+        self.clashes = bracket.all
+        self.winners = [None] * len(self.clashes)
+        self.is_ready = bytearray(len(self.clashes))
+        self.ready = deque()
+        # slot (0 for competitor_a, 1 for competitor_b) that the winner
+        # and the loser of each clash take in their next clash
+        self.winner_slot = [None] * len(self.clashes)
+        self.loser_slot = [None] * len(self.clashes)
+        self._assign_slots()
+        for idx in range(len(self.clashes)):
+            self._check_clash(idx)
+
+    def _assign_slots(self):
+        feeders = [[] for _ in self.clashes]
+        for idx, clash in enumerate(self.clashes):
+            if clash.winner_to is not None:
+                feeders[clash.winner_to].append((idx, self.winner_slot))
+            if clash.loser_to is not None and not clash.is_bye:
+                feeders[clash.loser_to].append((idx, self.loser_slot))
+        for clash, clash_feeders in zip(self.clashes, feeders):
+            empty_slots = [slot for slot, comp in enumerate(
+                (clash.competitor_a, clash.competitor_b)) if comp is None]
+            if clash.is_bye:
+                empty_slots = empty_slots[:1]
+            for (idx, slots), slot in zip(clash_feeders, empty_slots):
+                slots[idx] = slot
+
+    def _place(self, idx, slot, competitor):
+        clash = self.clashes[idx]
+        if slot == 0 and clash.competitor_a is None:
+            clash.competitor_a = competitor
+        elif slot == 1 and clash.competitor_b is None:
+            clash.competitor_b = competitor
+        else:
+            clash.add_competitor(competitor)
+        self._check_clash(idx)
+
+    def _check_clash(self, idx):
+        clash = self.clashes[idx]
+        if self.is_ready[idx] or clash.competitor_a is None:
+            return
+        if clash.is_bye:
+            self.is_ready[idx] = 1
+            self._set_winner(idx, clash.competitor_a, None)
+        elif clash.competitor_b is not None:
+            self.is_ready[idx] = 1
+            self.ready.append(idx)
+
+    def _set_winner(self, idx, winner, loser):
+        clash = self.clashes[idx]
+        self.winners[idx] = winner
+        if clash.winner_to is not None:
+            self._place(clash.winner_to, self.winner_slot[idx], winner)
+        if loser is not None and clash.loser_to is not None:
+            self._place(clash.loser_to, self.loser_slot[idx], loser)
+
+    def next_clash(self):
+        """Returns the index of the next clash ready to be fought, and
+        removes it from the ready queue. Returns None if there is no
+        clash ready.
+        """
+        while self.ready:
+            idx = self.ready.popleft()
+            if self.winners[idx] is None:
+                return idx
+        return None
+
+    def record_result(self, clash_idx, winner):
+        """Records the winner of a clash, and moves the competitors to
+        their next clashes.
+
+        The clash does not need to be taken from `next_clash` first.
+
+        :param clash_idx: index of the clash in the bracket
+        :param winner: the winner competitor (it must be one of the
+            clash competitors)
+        """
+        clash = self.clashes[clash_idx]
+        if self.winners[clash_idx] is not None:
+            raise ValueError('Clash {} already has a result'.format(
+                clash_idx))
+        if clash.competitor_a is None or clash.competitor_b is None:
+            raise ValueError('Clash {} is not ready'.format(clash_idx))
+        if winner is clash.competitor_a:
+            loser = clash.competitor_b
+        elif winner is clash.competitor_b:
+            loser = clash.competitor_a
+        else:
+            raise ValueError('Winner is not a competitor of clash {}'.format(
+                clash_idx))
+        self._set_winner(clash_idx, winner, loser)
+
+    def winner(self, clash_idx):
+        """Returns the winner of a clash, or None if it does not have
+        a result yet."""
+        return self.winners[clash_idx]
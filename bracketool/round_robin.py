@@ -0,0 +1,96 @@
+"""
+    Round robin pools, where every competitor faces all the others.
+
+    The rounds are built with the circle method: one competitor stays
+    in place, and the others rotate one position after each round, so
+    every pair meets exactly once in n - 1 rounds (n rounds if the
+    number of competitors is odd, with a bye for one of them in each
+    round).
+"""
+
+import random
+import time
+
+from bracketool.domain import Clash, ClashGenerator
+
+
+class RoundRobin(object):
+    def __init__(self):
+        self.rounds = []
+        self.all = []
+
+    def round(self, idx):
+        return self.rounds[idx]
+
+
+def circle_pairings(num_competitors):
+    """Yields, for each round, the list of (idx_a, idx_b) positions
+    of the clashes, using the circle method. If the number of
+    competitors is odd, idx_b is None for the competitor with a bye.
+    """
+    size = num_competitors + (num_competitors % 2)
+    rotating = size - 1
+    for nr in range(rotating):
+        pairs = []
+        # the fixed competitor alternates sides to balance them
+        other = nr + 1
+        pairs.append((0, other) if nr % 2 == 0 else (other, 0))
+        for pos in range(1, size // 2):
+            idx_a = (nr + pos) % rotating + 1
+            idx_b = (nr - pos) % rotating + 1
+            pairs.append((idx_a, idx_b))
+        if size != num_competitors:
+            # the last position is empty: its opponent has a bye
+            pairs = [(idx_b, None) if idx_a == num_competitors
+                     else (idx_a, None) if idx_b == num_competitors
+                     else (idx_a, idx_b)
+                     for idx_a, idx_b in pairs]
+        yield pairs
+
+
+class RoundRobinGen(ClashGenerator):
+    """Creates round robin pools."""
+
+    def __init__(self, shuffle=True, random_seed=None):
+        """
+        :param shuffle: randomize the order of the competitors, that
+            decides who they face in each round.
+        """
+        if random_seed is None:
+            random_seed = time.time()
+        self.rnd = random.Random(random_seed)
+        self.shuffle = shuffle
+
+    def generate(self, competitor_list, team_pairing_count=None):
+        """Generates the rounds of the pool.
+
+        :param team_pairing_count: dict counting the times that two
+            teams have been paired, updated with the new pairings.
+        """
+        competitors = list(competitor_list)
+        if self.shuffle:
+            self.rnd.shuffle(competitors)
+        res = RoundRobin()
+        for pairs in circle_pairings(len(competitors)):
+            clashes = []
+            for idx_a, idx_b in pairs:
+                if idx_b is None:
+                    clash = Clash(competitors[idx_a])
+                    clash.is_bye = True
+                else:
+                    clash = Clash(competitors[idx_a], competitors[idx_b])
+                    _count_team_pairing(clash, team_pairing_count)
+                clashes.append(clash)
+            res.rounds.append(clashes)
+            res.all.extend(clashes)
+        return res
+
+
+def _count_team_pairing(clash, team_pairing_count):
+    if team_pairing_count is None:
+        return
+    team_a = clash.competitor_a.team
+    team_b = clash.competitor_b.team
+    if team_a and team_b:
+        pt = (min(team_a, team_b), max(team_a, team_b))
+        team_pairing_count[pt] = team_pairing_count.get(pt, 0) + 1
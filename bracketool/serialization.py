@@ -0,0 +1,217 @@
+"""Compact binary format for generated brackets.
+
+A bracket is stored as the columns of a `CompactSingleElimination`:
+the clash arrays (competitor indices, bye flags, `winner_to` and
+`loser_to`), the size of each round, and a competitor table (name and
+team as indices of an interned value table, and the rating). Names and
+teams can be strings or integers, and they are loaded with the same
+type.
+
+The file has a fixed size header followed by the columns, each one
+aligned to 8 bytes. Numbers are little endian. When loading, the
+columns are `memoryview` casts of the given buffer, so a bracket
+loaded from a memory mapped file is not copied, and competitors are
+only created when a clash that holds them is read.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+
+from bracketool.domain import Competitor
+from bracketool.single_elimination import CompactSingleElimination
+
+
+_HEADER = struct.Struct('<8sIIIIII')
+_MAGIC = b'BKTSE002'
+# flags
+_FLOAT_RATINGS = 1
+# type tag of the interned values
+_STR_TAG = b's'
+_INT_TAG = b'i'
+_NATIVE_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class CompetitorTable(object):
+    """Read only sequence of the competitors of a loaded bracket.
+
+    A `Competitor` is created the first time it is accessed, and then
+    kept, so the same object is returned for every clash that holds it.
+    """
+
+    def __init__(self, names, teams, ratings, string_offsets, strings):
+        self._names = names
+        self._teams = teams
+        self._ratings = ratings
+        self._string_offsets = string_offsets
+        self._strings = strings
+        self._competitors = [None] * len(names)
+
+    def _value(self, idx):
+        if idx < 0:
+            return None
+        begin = self._string_offsets[idx]
+        end = self._string_offsets[idx + 1]
+        value = bytes(self._strings[begin + 1:end]).decode('utf-8')
+        if self._strings[begin] == _INT_TAG[0]:
+            return int(value)
+        return value
+
+    def __len__(self):
+        return len(self._competitors)
+
+    def __getitem__(self, idx):
+        comp = self._competitors[idx]
+        if comp is None:
+            comp = Competitor(self._value(self._names[idx]),
+                              self._value(self._teams[idx]),
+                              self._ratings[idx])
+            self._competitors[idx] = comp
+        return comp
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def append(self, competitor):
+        self._competitors.append(competitor)
+
+
+def _column_bytes(typecode, column):
+    if _NATIVE_LITTLE_ENDIAN:
+        return memoryview(column).tobytes()
+    column = array(typecode, column)
+    column.byteswap()
+    return column.tobytes()
+
+
+def dumps(bracket):
+    """Returns the bracket serialized as bytes.
+
+    :param bracket: a `SingleElimination` (or any bracket with a
+        `compact` method), or a `CompactSingleElimination`.
+        Competitor names and teams must be strings, integers or None
+        (it raises a TypeError otherwise).
+    """
+    if not isinstance(bracket, CompactSingleElimination):
+        bracket = bracket.compact()
+    string_idx = {}
+    strings = []
+
+    def intern(value):
+        if value is None:
+            return -1
+        if isinstance(value, str):
+            tag = _STR_TAG
+        elif isinstance(value, int) and not isinstance(value, bool):
+            tag = _INT_TAG
+        else:
+            raise TypeError('cannot serialize competitor name or team '
+                            '{!r}'.format(value))
+        key = tag + str(value).encode('utf-8')
+        idx = string_idx.get(key)
+        if idx is None:
+            idx = string_idx[key] = len(strings)
+            strings.append(key)
+        return idx
+
+    names = array('i', (intern(comp.name) for comp in bracket.competitors))
+    teams = array('i', (intern(comp.team) for comp in bracket.competitors))
+    ratings = [comp.rating for comp in bracket.competitors]
+    flags = 0
+    if all(isinstance(rating, int) for rating in ratings):
+        ratings = array('q', ratings)
+    else:
+        ratings = array('d', ratings)
+        flags |= _FLOAT_RATINGS
+    string_offsets = array('I', [0])
+    for value in strings:
+        string_offsets.append(string_offsets[-1] + len(value))
+    blob = b''.join(strings)
+
+    parts = [_HEADER.pack(_MAGIC, flags, len(bracket.round_sizes),
+                          len(bracket.winner_to), len(names), len(strings),
+                          len(blob))]
+    for typecode, column in (('i', bracket.round_sizes),
+                             ('i', bracket.competitor_a),
+                             ('i', bracket.competitor_b),
+                             ('i', bracket.winner_to),
+                             ('i', bracket.loser_to),
+                             ('b', bracket.is_bye),
+                             ('i', names),
+                             ('i', teams),
+                             (ratings.typecode, ratings),
+                             ('I', string_offsets)):
+        data = _column_bytes(typecode, column)
+        parts.append(data)
+        parts.append(bytes(-len(data) % 8))
+    parts.append(blob)
+    return b''.join(parts)
+
+
+def loads(data):
+    """Returns a `CompactSingleElimination` read from a buffer (bytes,
+    bytearray, mmap, ...) created with `dumps`.
+
+    Its columns are views of the buffer (copies, on big endian
+    machines), so the buffer must not be modified or closed while the
+    bracket is in use. Read only buffers give read only brackets.
+    """
+    view = memoryview(data)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    if len(view) < _HEADER.size:
+        raise ValueError('data is not a serialized bracket')
+    (magic, flags, num_rounds, num_clashes, num_competitors, num_strings,
+     strings_size) = _HEADER.unpack_from(view, 0)
+    if magic != _MAGIC:
+        raise ValueError('data is not a serialized bracket')
+    offset = _HEADER.size
+
+    def column(typecode, count):
+        nonlocal offset
+        size = count * array(typecode).itemsize
+        if offset + size > len(view):
+            raise ValueError('serialized bracket is truncated')
+        if _NATIVE_LITTLE_ENDIAN:
+            res = view[offset:offset + size].cast(typecode)
+        else:
+            res = array(typecode)
+            res.frombytes(view[offset:offset + size])
+            res.byteswap()
+        offset += size + (-size % 8)
+        return res
+
+    round_sizes = column('i', num_rounds)
+    competitor_a = column('i', num_clashes)
+    competitor_b = column('i', num_clashes)
+    winner_to = column('i', num_clashes)
+    loser_to = column('i', num_clashes)
+    is_bye = column('b', num_clashes)
+    names = column('i', num_competitors)
+    teams = column('i', num_competitors)
+    ratings = column('d' if flags & _FLOAT_RATINGS else 'q',
+                     num_competitors)
+    string_offsets = column('I', num_strings + 1)
+    if offset + strings_size > len(view):
+        raise ValueError('serialized bracket is truncated')
+    strings = view[offset:offset + strings_size]
+    competitors = CompetitorTable(names, teams, ratings, string_offsets,
+                                  strings)
+    return CompactSingleElimination(competitors, competitor_a, competitor_b,
+                                    is_bye, winner_to, loser_to, round_sizes)
+
+
+def dump(bracket, path):
+    """Writes the bracket to a file (see `dumps`)."""
+    with open(path, 'wb') as f:
+        f.write(dumps(bracket))
+
+
+def load(path):
+    """Loads a bracket written with `dump`, memory mapping the file
+    (see `loads`). Only the pages that are read are loaded."""
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(data)
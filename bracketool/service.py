@@ -0,0 +1,166 @@
+"""Generate brackets from asyncio code.
+
+`BracketService` runs the generation in a bounded pool of worker
+processes, so the event loop is not blocked while a big category is
+drawn. Requests for the same category and random seed that arrive
+while one is running share its result instead of generating the
+bracket again.
+
+A category only reads and updates the pairing counts of its own
+teams. As in `bracketool.batch`, categories that share teams with a
+running one wait for it, so the pairing counts are the same as
+generating them one after another, and categories without shared
+teams run at the same time.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from bracketool.batch import category_teams, teams_pairing_count
+from bracketool.single_elimination import SingleEliminationGen
+
+
+def _generate_bracket(generator, competitor_list, team_pairing_count,
+                      presorted):
+    res = generator.generate(competitor_list, team_pairing_count, presorted)
+    report = getattr(generator.instrumentation, 'last_report', None)
+    return res, team_pairing_count, report
+
+
+class BracketService(object):
+    """Async facade to generate brackets in worker processes."""
+
+    def __init__(self, generator_class=SingleEliminationGen,
+                 max_workers=None, executor=None, **generator_options):
+        """
+        :param generator_class: the generator used for every request
+            (`SingleEliminationGen`, `DoubleEliminationGen`, ...). It is
+            created with the request random seed and generator_options.
+            An instrumentation in generator_options gets the reports
+            of the workers (see `Instrumentation.worker`).
+        :param max_workers: maximum number of worker processes (None
+            for the number of processors).
+        :param executor: an executor to use instead of creating a
+            process pool (it is not shut down by `close`).
+        """
+        self.generator_class = generator_class
+        self.generator_options = generator_options
+        self.max_workers = max_workers
+        self._executor = executor
+        self._owns_executor = executor is None
+        # (category, random_seed) -> [task, number of waiters]
+        self._running = {}
+        # team -> task of the last requested generation with the team
+        self._team_tasks = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers)
+        return self._executor
+
+    async def _run(self, depends_on, competitor_list, random_seed,
+                   team_pairing_count, presorted):
+        if depends_on:
+            # wait for the generations that share teams, whatever their
+            # outcome
+            await asyncio.wait(depends_on)
+        generator = self.generator_class(random_seed=random_seed,
+                                         **self.generator_options)
+        instrumentation = generator.instrumentation
+        generator.instrumentation = instrumentation.worker()
+        cat_pairing_count = None
+        if team_pairing_count is not None:
+            cat_pairing_count = teams_pairing_count(
+                team_pairing_count, category_teams(competitor_list))
+        loop = asyncio.get_event_loop()
+        res, new_pairing_count, report = await loop.run_in_executor(
+            self._get_executor(), _generate_bracket, generator,
+            competitor_list, cat_pairing_count, presorted)
+        if team_pairing_count is not None:
+            team_pairing_count.update(new_pairing_count)
+        if report is not None:
+            instrumentation.record(report)
+        return res
+
+    def _start(self, key, competitor_list, random_seed, team_pairing_count,
+               presorted):
+        teams = category_teams(competitor_list) \
+            if team_pairing_count is not None else ()
+        depends_on = {self._team_tasks[team] for team in teams
+                      if team in self._team_tasks}
+        loop = asyncio.get_event_loop()
+        task = loop.create_task(self._run(
+            depends_on, list(competitor_list), random_seed,
+            team_pairing_count, presorted))
+        entry = [task, 0]
+        self._running[key] = entry
+        for team in teams:
+            self._team_tasks[team] = task
+
+        def done(task):
+            if self._running.get(key) is entry:
+                del self._running[key]
+            for team in teams:
+                if self._team_tasks.get(team) is task:
+                    del self._team_tasks[team]
+            if not task.cancelled():
+                # retrieved here, so it is not reported as never
+                # retrieved when no request is waiting for it
+                task.exception()
+
+        task.add_done_callback(done)
+        return entry
+
+    async def generate(self, category, competitor_list, random_seed,
+                       team_pairing_count=None, presorted=False):
+        """Generates the bracket of a category.
+
+        If a request for the same category and random seed is running,
+        it waits for that one, and returns the same bracket object.
+
+        Cancelling the call stops waiting for the result. The
+        generation itself is cancelled when no request is waiting for
+        it, unless it is already running in a worker.
+
+        :param category: hashable id of the category
+        :param competitor_list: list of competitors
+        :param random_seed: seed for the generator
+        :param team_pairing_count: dict counting the times that two
+            teams have been paired. It is updated with the new pairings
+            when the generation finishes (only by the request that
+            started it). The generation starts after the running ones
+            that share any of its teams.
+        :param presorted: the competitor list is already sorted for
+            seeding (see `bracketool.loader`).
+        """
+        key = (category, random_seed)
+        entry = self._running.get(key)
+        if entry is None:
+            entry = self._start(key, competitor_list, random_seed,
+                                team_pairing_count, presorted)
+        entry[1] += 1
+        try:
+            res = await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            entry[1] -= 1
+            if entry[1] == 0:
+                entry[0].cancel()
+            raise
+        entry[1] -= 1
+        return res
+
+    def close(self):
+        """Cancels the generations that did not start, and shuts down
+        the worker processes (if they were created by the service)."""
+        for task, _ in list(self._running.values()):
+            task.cancel()
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,137 @@
+"""Monte Carlo simulation of generated brackets.
+
+Plays a bracket out many times, deciding each clash with the Elo
+expected score of the competitors (see `EloRating`), to estimate the
+probability of each competitor reaching each round. It can be used to
+check how fair the seeding of a bracket is before publishing it.
+
+All the simulations of a chunk are played at once with NumPy, one
+round at a time, and chunks can be spread across a process pool.
+Requires NumPy.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from bracketool.elorating import EloRating
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _bracket_layout(bracket):
+    """Returns the competitors, the competitor indices of the first
+    round clashes, and for each following round the positions of the
+    previous round clashes whose winners fill each clash.
+
+    Empty slots use the index len(competitors).
+    """
+    competitors = []
+    comp_idx = {}
+    slots = ([], [])
+    for clash in bracket.rounds[0]:
+        for slot, comp in zip(slots, (clash.competitor_a,
+                                      clash.competitor_b)):
+            if comp is not None and id(comp) not in comp_idx:
+                comp_idx[id(comp)] = len(competitors)
+                competitors.append(comp)
+            slot.append(None if comp is None else comp_idx[id(comp)])
+    empty = len(competitors)
+    first_round = [np.array([empty if idx is None else idx for idx in slot],
+                            dtype=np.intp)
+                   for slot in slots]
+    feeders = []
+    offset = 0
+    for prev_round, next_round in zip(bracket.rounds[:-1],
+                                      bracket.rounds[1:]):
+        next_offset = offset + len(prev_round)
+        from_clashes = [[] for _ in next_round]
+        for pos, clash in enumerate(prev_round):
+            if clash.winner_to is not None:
+                from_clashes[clash.winner_to - next_offset].append(pos)
+        # an extra column with empty winners, for clashes with
+        # less than two feeders
+        missing = len(prev_round)
+        feeders.append(tuple(
+            np.array([(clash_from + [missing, missing])[slot]
+                      for clash_from in from_clashes], dtype=np.intp)
+            for slot in (0, 1)))
+        offset = next_offset
+    return competitors, first_round, feeders
+
+
+def _simulate_chunk(ratings, first_round, feeders, num_simulations, seed):
+    """Plays num_simulations of the bracket, and returns how many times
+    each competitor reached each round (the last one is winning)."""
+    rng = np.random.default_rng(seed)
+    elo = EloRating()
+    empty = len(ratings) - 1
+    num_rounds = len(feeders) + 1
+    counts = np.zeros((len(ratings), num_rounds + 1), dtype=np.int64)
+    comp_a = np.tile(first_round[0], (num_simulations, 1))
+    comp_b = np.tile(first_round[1], (num_simulations, 1))
+    counts[:, 0] = num_simulations * (
+        np.bincount(first_round[0], minlength=len(ratings)) +
+        np.bincount(first_round[1], minlength=len(ratings)))
+    # first round clashes are the same in all simulations
+    expected = elo.expected_scores(ratings[first_round[0]],
+                                   ratings[first_round[1]])
+    for num_round in range(num_rounds):
+        if num_round > 0:
+            expected = elo.expected_scores(ratings[comp_a], ratings[comp_b])
+        a_wins = rng.random(comp_a.shape) < expected
+        # byes and empty slots
+        a_wins |= comp_b == empty
+        a_wins &= comp_a != empty
+        winners = np.where(a_wins, comp_a, comp_b)
+        counts[:, num_round + 1] = np.bincount(winners.ravel(),
+                                               minlength=len(ratings))
+        if num_round + 1 < num_rounds:
+            winners = np.hstack(
+                (winners, np.full((num_simulations, 1), empty)))
+            comp_a = winners[:, feeders[num_round][0]]
+            comp_b = winners[:, feeders[num_round][1]]
+    return counts
+
+
+def simulate_bracket(bracket, num_simulations=100000, random_seed=None,
+                     processes=1, chunk_size=10000):
+    """Estimates the probability of each competitor reaching each
+    round of a bracket.
+
+    :param bracket: a generated bracket (like `SingleElimination`),
+        with the first round competitors assigned.
+    :param num_simulations: number of times the bracket is played.
+    :param random_seed: seed for the simulations. Results only depend
+        on the seed and the chunk size, not on the processes.
+    :param processes: number of worker processes (1 to run the
+        simulations in this process, None for the number of
+        processors).
+    :param chunk_size: maximum number of simulations played at once.
+
+    :returns: an OrderedDict of competitor to a list of probabilities,
+        one for each round, and a last one for winning the bracket.
+    """
+    if np is None:
+        raise ImportError('NumPy is required to simulate brackets')
+    if not bracket.rounds or not bracket.rounds[0]:
+        return OrderedDict()
+    competitors, first_round, feeders = _bracket_layout(bracket)
+    ratings = np.array([comp.rating for comp in competitors] + [0],
+                       dtype=np.float64)
+    chunks = [min(chunk_size, num_simulations - begin)
+              for begin in range(0, num_simulations, chunk_size)]
+    seeds = np.random.SeedSequence(random_seed).spawn(len(chunks))
+    args = [(ratings, first_round, feeders, size, seed)
+            for size, seed in zip(chunks, seeds)]
+    if processes == 1:
+        chunk_counts = [_simulate_chunk(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunk_counts = list(executor.map(_simulate_chunk, *zip(*args)))
+    counts = sum(chunk_counts)
+    return OrderedDict(
+        (comp, (counts[idx] / num_simulations).tolist())
+        for idx, comp in enumerate(competitors))
@@ -6,22 +6,229 @@
 import math
 import random
 import time
+from array import array
+from functools import lru_cache
 
 from bracketool.domain import Clash, ClashGenerator
 from bracketool.brackets import generate_first_round_clashes
 from bracketool.teambrackets import create_reserved_teams_bracket_clashes
 from bracketool.teambrackets import clashes_team_count
 from bracketool.pairings import PairingsGenerator
+from bracketool.instrumentation import NULL_INSTRUMENTATION
+
+
+@lru_cache(maxsize=64)
+def _single_elimination_skeleton(num_clashes, third_place=False):
+    """Returns the number of clashes of each round, and the `winner_to`
+    and `loser_to` indices for every clash (-1 for None) of a single
+    elimination bracket with num_clashes in the first round.
+
+    Clashes are indexed round after round, as in `SingleElimination.all`.
+    If third_place is set (and there are semifinals), the last round
+    has the final and, after it, the clash for the third place between
+    the semifinal losers.
+    """
+    round_sizes = [num_clashes]
+    while round_sizes[-1] > 1:
+        round_sizes.append(round_sizes[-1] // 2)
+    winner_to = array('i')
+    begin = 0
+    for size in round_sizes[:-1]:
+        next_begin = begin + size
+        winner_to.extend(next_begin + nr // 2 for nr in range(size))
+        begin = next_begin
+    if num_clashes:
+        # the final
+        winner_to.append(-1)
+    loser_to = array('i', [-1]) * len(winner_to)
+    if third_place and num_clashes > 1:
+        winner_to.append(-1)
+        loser_to.append(-1)
+        loser_to[begin - 2] = loser_to[begin - 1] = begin + 1
+        round_sizes[-1] = 2
+    return tuple(round_sizes), winner_to, loser_to
+
+
+# a final between three competitors, where each one faces the other
+# two: the first round has the first clash and the bye of the third
+# competitor, and the last round the final, between the winner of the
+# first clash and the third competitor, and the clash of the third
+# competitor against the loser of the first clash. Indexed by the
+# position of the bye in the first round.
+_THREE_WAY_FINAL_SKELETONS = (
+    ((2, 2), array('i', [2, 2, -1, -1]), array('i', [-1, 3, -1, -1])),
+    ((2, 2), array('i', [2, 2, -1, -1]), array('i', [3, -1, -1, -1])),
+)
 
 
 class SingleElimination(object):
     def __init__(self):
         self.rounds = []
         self.all = []
+        # instrumentation report of the generation, if enabled
+        self.stats = None
 
     def round(self, idx):
         return self.rounds[idx]
 
+    def compact(self):
+        """Returns a `CompactSingleElimination` copy of this bracket."""
+        return CompactSingleElimination.from_single_elimination(self)
+
+
+class ClashView(object):
+    """Lightweight view of a clash stored in a `CompactSingleElimination`.
+
+    It has the same attributes and methods as `Clash`, reading and
+    writing the columns of the bracket.
+    """
+
+    __slots__ = ('bracket', 'idx')
+
+    def __init__(self, bracket, idx):
+        self.bracket = bracket
+        self.idx = idx
+
+    def _get_competitor(self, column):
+        comp_idx = column[self.idx]
+        return None if comp_idx < 0 else self.bracket.competitors[comp_idx]
+
+    def _get_index(self, column):
+        value = column[self.idx]
+        return None if value < 0 else value
+
+    @property
+    def competitor_a(self):
+        return self._get_competitor(self.bracket.competitor_a)
+
+    @competitor_a.setter
+    def competitor_a(self, competitor):
+        self.bracket.competitor_a[self.idx] = \
+            self.bracket.competitor_index(competitor)
+
+    @property
+    def competitor_b(self):
+        return self._get_competitor(self.bracket.competitor_b)
+
+    @competitor_b.setter
+    def competitor_b(self, competitor):
+        self.bracket.competitor_b[self.idx] = \
+            self.bracket.competitor_index(competitor)
+
+    @property
+    def winner_to(self):
+        return self._get_index(self.bracket.winner_to)
+
+    @winner_to.setter
+    def winner_to(self, value):
+        self.bracket.winner_to[self.idx] = -1 if value is None else value
+
+    @property
+    def loser_to(self):
+        return self._get_index(self.bracket.loser_to)
+
+    @loser_to.setter
+    def loser_to(self, value):
+        self.bracket.loser_to[self.idx] = -1 if value is None else value
+
+    @property
+    def is_bye(self):
+        return bool(self.bracket.is_bye[self.idx])
+
+    @is_bye.setter
+    def is_bye(self, value):
+        self.bracket.is_bye[self.idx] = 1 if value else 0
+
+    has_spot = Clash.has_spot
+    add_competitor = Clash.add_competitor
+    __repr__ = Clash.__repr__
+    __str__ = Clash.__str__
+
+
+class CompactSingleElimination(object):
+    """Struct of arrays representation of a `SingleElimination`.
+
+    Competitors are stored once in the `competitors` list, and each
+    clash attribute is an array column indexed by the position of the
+    clash in `all`: competitor_a and competitor_b hold competitor
+    indices, winner_to and loser_to hold clash indices (-1 for None),
+    and is_bye holds 0 or 1.
+
+    `all`, `rounds` and `round` return `ClashView` objects, so it can
+    be used in place of a `SingleElimination`.
+    """
+
+    def __init__(self, competitors, competitor_a, competitor_b, is_bye,
+                 winner_to, loser_to, round_sizes):
+        self.competitors = competitors
+        self.competitor_a = competitor_a
+        self.competitor_b = competitor_b
+        self.is_bye = is_bye
+        self.winner_to = winner_to
+        self.loser_to = loser_to
+        self.round_sizes = round_sizes
+        # built on the first lookup, so competitors can be a lazy
+        # sequence (see `bracketool.serialization`)
+        self._competitor_idx = None
+
+    @classmethod
+    def from_single_elimination(cls, single_elimination):
+        competitors = []
+        res = cls(competitors, array('i'), array('i'), array('b'),
+                  array('i'), array('i'),
+                  array('i', [len(rnd) for rnd in single_elimination.rounds]))
+        for clash in single_elimination.all:
+            res.competitor_a.append(res.competitor_index(clash.competitor_a))
+            res.competitor_b.append(res.competitor_index(clash.competitor_b))
+            res.is_bye.append(1 if clash.is_bye else 0)
+            res.winner_to.append(
+                -1 if clash.winner_to is None else clash.winner_to)
+            res.loser_to.append(
+                -1 if clash.loser_to is None else clash.loser_to)
+        return res
+
+    def to_single_elimination(self):
+        """Returns a `SingleElimination` with new `Clash` objects."""
+        res = SingleElimination()
+        for view in self.all:
+            clash = Clash(view.competitor_a, view.competitor_b,
+                          view.winner_to, view.loser_to)
+            clash.is_bye = view.is_bye
+            res.all.append(clash)
+        begin = 0
+        for size in self.round_sizes:
+            res.rounds.append(res.all[begin:begin + size])
+            begin += size
+        return res
+
+    def competitor_index(self, competitor):
+        """Returns the index of the competitor in `competitors` (adding
+        it if needed), or -1 for None."""
+        if competitor is None:
+            return -1
+        if self._competitor_idx is None:
+            self._competitor_idx = {
+                id(comp): idx for idx, comp in enumerate(self.competitors)}
+        idx = self._competitor_idx.get(id(competitor))
+        if idx is None:
+            idx = len(self.competitors)
+            self.competitors.append(competitor)
+            self._competitor_idx[id(competitor)] = idx
+        return idx
+
+    @property
+    def all(self):
+        return [ClashView(self, idx) for idx in range(len(self.winner_to))]
+
+    @property
+    def rounds(self):
+        return [self.round(idx) for idx in range(len(self.round_sizes))]
+
+    def round(self, idx):
+        begin = sum(self.round_sizes[:idx])
+        return [ClashView(self, clash_idx)
+                for clash_idx in range(begin, begin + self.round_sizes[idx])]
+
 
 class SingleEliminationGen(ClashGenerator):
     """Creates single elimination brackets."""
@@ -31,47 +238,115 @@ class SingleEliminationGen(ClashGenerator):
                  third_place_clash=True,
                  use_teams=True,
                  use_rating=True,
-                 random_seed=None):
+                 random_seed=None,
+                 instrumentation=None):
+        """
+        :param use_three_way_final: with three competitors, each one
+            faces the other two instead of playing a bracket.
+        :param third_place_clash: add a clash for the third place
+            between the semifinal losers, after the final (in the
+            same last round).
+        :param instrumentation: optional
+            `bracketool.instrumentation.Instrumentation` to measure the
+            generation phases. The report is also stored in the `stats`
+            of the result.
+        """
         if random_seed is None:
             random_seed = time.time()
         self.rnd = random.Random(random_seed)
         self.use_three_way_final = use_three_way_final
+        self.third_place_clash = third_place_clash
         self.use_teams = use_teams
         self.use_rating = use_rating
         self.team_pairing_count = {}
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
 
-    def _generate_threeway_final(self, clashes):
-        # TODO: Implement the three way final
-        return clashes
-
+    def _generate_threeway_final(self, clashes, team_pairing_count):
+        """Creates the three way final from the two first round clashes
+        of three competitors (one of them with a bye), counting the
+        pairings of the competitor with the bye against the other two.
+        """
+        bye_pos = 0 if clashes[0].is_bye else 1
+        first_clash = clashes[1 - bye_pos]
+        rested = clashes[bye_pos].competitor_a
+        if team_pairing_count is not None and rested.team:
+            for comp in (first_clash.competitor_a, first_clash.competitor_b):
+                if comp.team:
+                    pt = (min(rested.team, comp.team),
+                          max(rested.team, comp.team))
+                    team_pairing_count[pt] = \
+                        team_pairing_count.get(pt, 0) + 1
+        return self._wire_rounds(clashes + [Clash(), Clash(rested)],
+                                 _THREE_WAY_FINAL_SKELETONS[bye_pos])
 
-    def generate(self, competitor_list, team_pairing_count=None):
+    def _pairings_generator(self):
+        """Creates the first round generator for the next generate call,
+        seeded from this generator."""
         rseed = self.rnd.randint(0, 1 << 31)
-        pg = PairingsGenerator(use_teams=self.use_teams,
-                               use_rating=self.use_rating,
-                               random_seed=self.rnd.randint(0, 1 << 31))
-        clashes = pg.generate(competitor_list, team_pairing_count)
-        if self.use_three_way_final and len(clashes) == 2 and \
-                (clashes[0].is_bye or clashes[1].is_bye):
-            return self._generate_threeway_final(competitor_list)
-        # TODO build the rest of clashes based on the config
+        return PairingsGenerator(use_teams=self.use_teams,
+                                 use_rating=self.use_rating,
+                                 random_seed=self.rnd.randint(0, 1 << 31),
+                                 instrumentation=self.instrumentation)
+
+    def generate(self, competitor_list, team_pairing_count=None,
+                 presorted=False):
+        """Generates the bracket.
+
+        :param presorted: the competitor list is already sorted with
+            `bracketool.loader.sort_for_seeding` (see
+            `PairingsGenerator.generate`).
+        """
+        return self._generate(self._pairings_generator(), competitor_list,
+                              team_pairing_count, presorted)
+
+    def _generate(self, pg, competitor_list, team_pairing_count,
+                  presorted=False):
+        instr = self.instrumentation
+        instr.start()
+        try:
+            res = self._generate_rounds(pg, competitor_list,
+                                        team_pairing_count, presorted)
+        finally:
+            report = instr.finish()
+        if instr.enabled and isinstance(res, SingleElimination):
+            res.stats = report
+        return res
+
+    def _generate_rounds(self, pg, competitor_list, team_pairing_count,
+                         presorted):
+        with self.instrumentation.phase('pairings'):
+            clashes = pg.generate(competitor_list, team_pairing_count,
+                                  presorted)
+        with self.instrumentation.phase('round_wiring'):
+            if self.use_three_way_final and len(clashes) == 2 and \
+                    (clashes[0].is_bye or clashes[1].is_bye):
+                return self._generate_threeway_final(clashes,
+                                                     team_pairing_count)
+            skeleton = _single_elimination_skeleton(len(clashes),
+                                                    self.third_place_clash)
+            res = self._wire_rounds(clashes, skeleton)
+            if len(res.rounds) > 1 and len(res.rounds[-1]) == 2:
+                # with a bye in the semifinals, the third place goes to
+                # the loser of the other semifinal
+                semifinals = res.rounds[-2]
+                if semifinals[0].is_bye or semifinals[1].is_bye:
+                    res.all[-1].is_bye = True
+            return res
+
+    def _wire_rounds(self, clashes, skeleton):
+        """Creates the bracket with the given first clashes, adding the
+        empty clashes of the skeleton, and wiring all of them."""
         res = SingleElimination()
-        res.rounds.append(clashes)
+        round_sizes, winner_to, loser_to = skeleton
         res.all.extend(clashes)
-        # iterate to build next round clashes:
-        last_round = clashes
-        while len(last_round)  > 1:
-            num_nr = len(last_round) // 2
-            next_round = [Clash() for _ in range(num_nr)]
-            res.rounds.append(next_round)
-            res.all.extend(next_round)
-            num_all = len(res.all)
-            for nr in range(num_nr):
-                idx = num_all - 3 * num_nr + (nr * 2)
-                to_idx = num_all - num_nr + nr
-                res.all[idx].winner_to = to_idx
-                res.all[idx+1].winner_to = to_idx
-            last_round = next_round
-        # TODO: check if we must insert a round previous to the last one
-        # to decide the third and fourth place
+        res.all.extend(Clash() for _ in range(len(winner_to) - len(clashes)))
+        for clash, to_idx, lose_idx in zip(res.all, winner_to, loser_to):
+            if to_idx >= 0:
+                clash.winner_to = to_idx
+            if lose_idx >= 0:
+                clash.loser_to = lose_idx
+        begin = 0
+        for size in round_sizes:
+            res.rounds.append(res.all[begin:begin + size])
+            begin += size
         return res
@@ -0,0 +1,244 @@
+"""
+    Swiss system tournaments.
+
+    Competitors play a fixed number of rounds, and in each round they
+    are paired with competitors with the same score (or the closest
+    one), avoiding rematches and, when possible, competitors of the same
+    team. Rounds are paired one at a time, after the results of the
+    previous round are recorded.
+"""
+
+import random
+import time
+from itertools import chain, groupby
+
+from bracketool.domain import Clash, ClashGenerator
+
+
+class PairingHistory(object):
+    """Opponents that each competitor has already faced.
+
+    Competitors are identified by their position in the tournament
+    competitor list, and the opponents of each one are kept in a set,
+    so checking if two competitors have met does not depend on the
+    number of rounds played.
+    """
+
+    def __init__(self, num_competitors):
+        self.opponents = [set() for _ in range(num_competitors)]
+
+    def add(self, idx_a, idx_b):
+        self.opponents[idx_a].add(idx_b)
+        self.opponents[idx_b].add(idx_a)
+
+    def met(self, idx_a, idx_b):
+        return idx_b in self.opponents[idx_a]
+
+
+class Swiss(object):
+    """State of a Swiss tournament.
+
+    `rounds` holds the clashes paired so far (`all` has them in index
+    order). Results are recorded with `record_result`, and the next
+    round is paired with `pair_round`.
+    """
+
+    def __init__(self, competitors, avoid_same_team=True, rank=None,
+                 team_pairing_count=None):
+        """
+        :param competitors: list of competitors
+        :param avoid_same_team: try not to pair competitors of the
+            same team
+        :param rank: list with the position of each competitor used
+            to break ties of score and rating (by default, their
+            position in the list)
+        :param team_pairing_count: dict counting the times that two
+            teams have been paired, updated with the new pairings.
+        """
+        self.competitors = competitors
+        self.avoid_same_team = avoid_same_team
+        self.rank = rank if rank is not None else list(range(len(competitors)))
+        self.team_pairing_count = team_pairing_count
+        self.rounds = []
+        self.all = []
+        self.scores = [0.0] * len(competitors)
+        self.had_bye = bytearray(len(competitors))
+        self.history = PairingHistory(len(competitors))
+        # competitor indices of each clash in all, and its result
+        self._clash_competitors = []
+        self._recorded = bytearray()
+        self._competitor_idx = {id(comp): idx
+                                for idx, comp in enumerate(competitors)}
+
+    def round(self, idx):
+        return self.rounds[idx]
+
+    def score(self, competitor):
+        return self.scores[self._competitor_idx[id(competitor)]]
+
+    def standings(self):
+        """Returns the competitors sorted by score."""
+        return [self.competitors[idx] for idx in self._ranking()]
+
+    def _ranking(self):
+        competitors = self.competitors
+        return sorted(range(len(competitors)),
+                      key=lambda idx: (-self.scores[idx],
+                                       -competitors[idx].rating,
+                                       self.rank[idx]))
+
+    def _compatible(self, idx_a, idx_b, allow_same_team, allow_rematch):
+        if not allow_rematch and self.history.met(idx_a, idx_b):
+            return False
+        if allow_same_team or not self.avoid_same_team:
+            return True
+        team = self.competitors[idx_a].team
+        return team is None or team != self.competitors[idx_b].team
+
+    def _pair_group(self, players, pairs, allow_same_team=False,
+                    allow_rematch=False):
+        """Pairs the top half of the players with the bottom half, in
+        order, skipping the incompatible opponents. The pairs are
+        appended to pairs, and the players that could not be paired
+        are returned."""
+        half = len(players) // 2
+        paired = bytearray(len(players))
+        for pos in range(half):
+            if paired[pos]:
+                continue
+            player = players[pos]
+            # try first the opponent at the same position of the bottom
+            # half, then the next ones, and then the top half players
+            candidates = chain(range(half + pos, len(players)),
+                               range(half, half + pos),
+                               range(pos + 1, half))
+            for opp_pos in candidates:
+                if not paired[opp_pos] and self._compatible(
+                        player, players[opp_pos], allow_same_team,
+                        allow_rematch):
+                    paired[pos] = paired[opp_pos] = 1
+                    pairs.append((player, players[opp_pos]))
+                    break
+        left = [player for pos, player in enumerate(players)
+                if not paired[pos]]
+        if len(left) > 1 and len(left) < len(players):
+            # pair what is left of the bottom half among themselves
+            return self._pair_group(left, pairs, allow_same_team,
+                                    allow_rematch)
+        return left
+
+    def _bye_competitor(self, ranking):
+        """Returns the lowest ranked competitor without a previous bye
+        (or the lowest ranked one, if all of them had one)."""
+        for idx in reversed(ranking):
+            if not self.had_bye[idx]:
+                return idx
+        return ranking[-1]
+
+    def pair_round(self):
+        """Pairs the next round, and returns its clashes.
+
+        Players are paired within their score group (players that
+        can not be paired float down to the next group). The players
+        left at the end are paired allowing same team clashes, and as
+        last resort, rematches.
+        """
+        ranking = self._ranking()
+        clashes = []
+        if len(ranking) % 2:
+            bye_idx = self._bye_competitor(ranking)
+            ranking.remove(bye_idx)
+            clash = Clash(self.competitors[bye_idx])
+            clash.is_bye = True
+            self.had_bye[bye_idx] = 1
+            self.scores[bye_idx] += 1
+            self._add_clash(clash, (bye_idx, None), True)
+            clashes.append(clash)
+        pairs = []
+        floaters = []
+        for _, group in groupby(ranking, key=lambda idx: self.scores[idx]):
+            floaters = self._pair_group(floaters + list(group), pairs)
+        if floaters:
+            floaters = self._pair_group(floaters, pairs, allow_same_team=True)
+        if floaters:
+            self._pair_group(floaters, pairs, allow_same_team=True,
+                             allow_rematch=True)
+        for idx_a, idx_b in pairs:
+            clash = Clash(self.competitors[idx_a], self.competitors[idx_b])
+            self.history.add(idx_a, idx_b)
+            self._count_team_pairing(clash)
+            self._add_clash(clash, (idx_a, idx_b), False)
+            clashes.append(clash)
+        self.rounds.append(clashes)
+        return clashes
+
+    def _add_clash(self, clash, competitor_indices, recorded):
+        self.all.append(clash)
+        self._clash_competitors.append(competitor_indices)
+        self._recorded.append(1 if recorded else 0)
+
+    def _count_team_pairing(self, clash):
+        if self.team_pairing_count is None:
+            return
+        team_a = clash.competitor_a.team
+        team_b = clash.competitor_b.team
+        if team_a and team_b:
+            pt = (min(team_a, team_b), max(team_a, team_b))
+            cnt = self.team_pairing_count.setdefault(pt, 0) + 1
+            self.team_pairing_count[pt] = cnt
+
+    def record_result(self, clash_idx, winner):
+        """Records the result of a clash.
+
+        :param clash_idx: index of the clash in `all`
+        :param winner: the winner competitor, or None for a draw (both
+            competitors get half a point)
+        """
+        if self._recorded[clash_idx]:
+            raise ValueError('Clash {} already has a result'.format(
+                clash_idx))
+        clash = self.all[clash_idx]
+        idx_a, idx_b = self._clash_competitors[clash_idx]
+        if winner is None:
+            self.scores[idx_a] += 0.5
+            self.scores[idx_b] += 0.5
+        elif winner is clash.competitor_a:
+            self.scores[idx_a] += 1
+        elif winner is clash.competitor_b:
+            self.scores[idx_b] += 1
+        else:
+            raise ValueError('Winner is not a competitor of clash {}'.format(
+                clash_idx))
+        self._recorded[clash_idx] = 1
+
+
+class SwissGen(ClashGenerator):
+    """Creates Swiss system tournaments."""
+
+    def __init__(self, avoid_same_team=True, random_seed=None):
+        """
+        :param avoid_same_team: try not to pair competitors of the
+            same team.
+        """
+        if random_seed is None:
+            random_seed = time.time()
+        self.rnd = random.Random(random_seed)
+        self.avoid_same_team = avoid_same_team
+
+    def generate(self, competitor_list, team_pairing_count=None):
+        """Creates the tournament and pairs its first round.
+
+        Competitors are ranked by rating, and competitors with the
+        same rating in random order.
+
+        :param team_pairing_count: dict counting the times that two
+            teams have been paired, updated with the new pairings.
+        """
+        competitors = list(competitor_list)
+        rank = list(range(len(competitors)))
+        self.rnd.shuffle(rank)
+        res = Swiss(competitors, self.avoid_same_team, rank,
+                    team_pairing_count)
+        if competitors:
+            res.pair_round()
+        return res
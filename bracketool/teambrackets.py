@@ -12,10 +12,12 @@
 """
 
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
 from bracketool.domain import Competitor, Clash
+from bracketool.pairinghistory import PairingCountOverlay
 from bracketool.brackets import generate_first_round_clashes
 from bracketool.brackets import brackets_max_depth_distance
-from bracketool.brackets import brackets_depth_distance
+from bracketool.brackets import depth_distance_table
 
 
 import math
@@ -69,8 +71,8 @@ def shuffle_teams_sorted_by_slots(teams_with_required_slots, rnd):
 def rate_clash_for_team(reservations, clashes, clash_idx, team,
                         team_pairing_count):
     """
-    Gives a rating number for that spot.
-    A smaller number for better spots, and bigger number
+    Gives a rating for that spot.
+    A smaller rating for better spots, and bigger rating
     for worse ones.
 
     Best spot -> not pairing
@@ -78,6 +80,11 @@ def rate_clash_for_team(reservations, clashes, clash_idx, team,
     Bye is better than pairing again with the same team
     Worse spot -> pairing with same team
 
+    The rating is a (same_team, penalty) tuple: same_team is 1 when
+    the clash already has a reservation for the team (so it is always
+    worse than any clash without it), and penalty is the weighted
+    count of pairings with the reserved teams (plus the number of byes
+    of the team for bye clashes).
 
     complexity: O(n)
     """
@@ -88,45 +95,242 @@ def rate_clash_for_team(reservations, clashes, clash_idx, team,
         return None
 
     same_team_factor = len(clashes) * len(clashes) * 4
+    # special penalization to face a member of the same team:
+    same_team = 1 if team in reserv else 0
     rating = 0
-    if team in reserv:
-        # special penalization to face a member of the same team:
-        rating = pow(same_team_factor, 127)
-
     if clash.is_bye:
         rating += team_pairing_count.get((None, team), 0)
     # this converts this function in quadratic complexity but gives
     # more precise ratings
     mdd = brackets_max_depth_distance(clashes)
+    distances = depth_distance_table(len(clashes))[clash_idx]
     for other_idx, other_reserv in enumerate(reservations):
-        d = brackets_depth_distance(clashes, other_idx, clash_idx)
+        d = distances[other_idx]
         for other_team in other_reserv:
             pt = (min(other_team, team), max(other_team, team))
             penalty = team_pairing_count.get(pt, 0)
             if other_team == team:
                 penalty = penalty + same_team_factor
             rating = rating + (mdd + 1 - d) * penalty
-    return rating
+    return (same_team, rating)
+
+
+class TeamReservationIndex(object):
+    """Keeps the `rate_clash_for_team` ratings of every clash for the
+    team that is being reserved, so the best clash is found without
+    rating the whole bracket again for each required slot.
+
+    The rating of a clash is the sum of the penalties reserved in each
+    subtree that contains it (from the clash itself up to the whole
+    bracket). So, it is stored as a segment tree where each node holds
+    the penalty of its subtree, and the minimum (rating, clash_idx) of
+    its bye and non bye clashes. Reserving a slot only walks the path
+    from the clash to the root: O(log n).
+
+    The penalty of a node is the weight of each team (its pairing count
+    with the selected team) times the number of slots of that team in
+    the subtree. Those counts are kept for each team, so changing the
+    weight of a team updates each node of the subtrees where it has
+    slots once, instead of walking the path of each one of its slots:
+    O(k log(n / k)) for a team with k slots.
+
+    Node 1 is the root, and the clash idx is stored at node idx + n.
+    The minimums are stored as (same_team, rating, clash_idx) tuples.
+    """
+
+    def __init__(self, clashes, reservations):
+        """
+        :param clashes: the list of first round clashes
+        :param reservations: list of team reservations for each clash
+            (it is updated in place by `assign`).
+        """
+        num_clashes = len(clashes)
+        self.clashes = clashes
+        self.reservations = reservations
+        self.num_clashes = num_clashes
+        self.same_team_factor = num_clashes * num_clashes * 4
+        self.team = None
+        self.team_weights = {}
+        self.team_clashes = defaultdict(list)
+        # team -> {node: number of slots of the team in its subtree}
+        self.team_nodes = defaultdict(dict)
+        for idx, reserv in enumerate(reservations):
+            for team in reserv:
+                self._add_team_clash(team, idx)
+        self.penalties = [0] * (2 * num_clashes)
+        # best[0] for non bye clashes, best[1] for bye clashes
+        self.best = ([None] * (2 * num_clashes), [None] * (2 * num_clashes))
+        for idx in range(num_clashes):
+            self._update_leaf(idx)
+        for node in range(num_clashes - 1, 0, -1):
+            self._pull(node)
+
+    def _update_leaf(self, idx):
+        node = idx + self.num_clashes
+        reserv = self.reservations[idx]
+        is_bye = self.clashes[idx].is_bye
+        self.best[0][node] = None
+        self.best[1][node] = None
+        if len(reserv) == 2 or (len(reserv) == 1 and is_bye):
+            return
+        same_team = 1 if self.team is not None and self.team in reserv \
+            else 0
+        self.best[1 if is_bye else 0][node] = \
+            (same_team, self.penalties[node], idx)
+
+    def _pull(self, node):
+        penalty = self.penalties[node]
+        for best in self.best:
+            left = best[2 * node]
+            right = best[2 * node + 1]
+            if left is None or (right is not None and right < left):
+                left = right
+            best[node] = None if left is None else \
+                (left[0], left[1] + penalty, left[2])
+
+    def _update(self, idx, penalty=0):
+        node = idx + self.num_clashes
+        while node > 0:
+            self.penalties[node] += penalty
+            node = node // 2
+        self._update_leaf(idx)
+        node = (idx + self.num_clashes) // 2
+        while node > 0:
+            self._pull(node)
+            node = node // 2
+
+    def _add_team_clash(self, team, idx):
+        self.team_clashes[team].append(idx)
+        nodes = self.team_nodes[team]
+        node = idx + self.num_clashes
+        while node > 0:
+            nodes[node] = nodes.get(node, 0) + 1
+            node = node // 2
+
+    def _add_team_weight(self, team, weight):
+        """Adds weight to the penalty of each slot of the team, and
+        updates the minimums of its subtrees (also when weight is 0,
+        to update the same_team flag of its clashes)."""
+        if weight:
+            self.team_weights[team] = self.team_weights.get(team, 0) + \
+                weight
+        nodes = self.team_nodes.get(team)
+        if not nodes:
+            return
+        # children have bigger node numbers than their parents
+        for node in sorted(nodes, reverse=True):
+            self.penalties[node] += weight * nodes[node]
+            if node >= self.num_clashes:
+                self._update_leaf(node - self.num_clashes)
+            else:
+                self._pull(node)
+
+    def set_team(self, team, team_pairing_count):
+        """Selects the team to rate clashes for.
+
+        :param team: the team that is going to be reserved
+        :param team_pairing_count: a dict with the count of times that
+            two teams have already been paired.
+        """
+        previous_team = self.team
+        self.team = team
+        weights = {}
+        for other_team in set(self.team_clashes) | {team}:
+            pt = (min(other_team, team), max(other_team, team))
+            weight = team_pairing_count.get(pt, 0)
+            if other_team == team:
+                weight = weight + self.same_team_factor
+            if weight:
+                weights[other_team] = weight
+        # only the teams whose weight changes (and the previous and new
+        # teams, to update the same_team flag) are updated
+        changed = set(weights) | set(self.team_weights)
+        changed.add(previous_team)
+        changed.add(team)
+        for other_team in changed:
+            self._add_team_weight(
+                other_team, weights.get(other_team, 0) -
+                self.team_weights.get(other_team, 0))
+        self.team_weights = weights
+
+    def best_clash(self, team_pairing_count):
+        """Returns the clash index with the lowest rating for the
+        selected team (the lowest index on ties).
+
+        It raises an IndexError if there is no available clash.
+        """
+        best, best_bye = self.best[0][1], self.best[1][1]
+        if best_bye is not None:
+            best_bye = (best_bye[0],
+                        best_bye[1] +
+                        team_pairing_count.get((None, self.team), 0),
+                        best_bye[2])
+            if best is None or best_bye < best:
+                best = best_bye
+        if best is None:
+            raise IndexError('No available clash for team {}'.format(
+                self.team))
+        return best[2]
+
+    def assign(self, clash_idx, team_pairing_count):
+        """Reserves the clash for the selected team, updating the team
+        pairing counts (see `assign_team_to_clash`)."""
+        reserv = self.reservations[clash_idx]
+        other_team = reserv[0] if len(reserv) == 1 else None
+        assign_team_to_clash(self.clashes, self.reservations, clash_idx,
+                             self.team, team_pairing_count)
+        if other_team is not None and team_pairing_count is not None:
+            self._add_team_weight(other_team, 1)
+        self._add_team_clash(self.team, clash_idx)
+        self._update(clash_idx, self.team_weights.get(self.team, 0))
+
+    def rating(self, clash_idx, team_pairing_count):
+        """Returns the rating of the clash for the selected team (the
+        same as `rate_clash_for_team`), or None if it is full."""
+        node = clash_idx + self.num_clashes
+        best = self.best[1 if self.clashes[clash_idx].is_bye else 0][node]
+        if best is None:
+            return None
+        rating = 0
+        while node > 0:
+            rating += self.penalties[node]
+            node = node // 2
+        if self.clashes[clash_idx].is_bye:
+            rating += team_pairing_count.get((None, self.team), 0)
+        return (best[0], rating)
+
+
+def _reservation_index_class(use_numpy):
+    if use_numpy:
+        # imported here, as the vectorized module extends this one
+        from bracketool import vectorized
+        if vectorized.numpy_available():
+            return vectorized.NumpyTeamReservationIndex
+    return TeamReservationIndex
 
 
 def reserve_slots_for_team(reservations, clashes, team, required_slots,
-                           team_pairing_count, rnd):
+                           team_pairing_count, rnd, index=None):
     """
     Assign the slots for the members of a team.
+
+    Each slot goes to the clash with the lowest `rate_clash_for_team`
+    rating (the lowest index on ties).
+
+    :param index: a `TeamReservationIndex` for the clashes and
+        reservations, to reuse it among teams. A new one is
+        created if not provided.
     """
-    ratings = []
+    if index is None:
+        index = TeamReservationIndex(clashes, reservations)
+    index.set_team(team, team_pairing_count)
     for _ in range(required_slots):
-        ratings = [(rate_clash_for_team(reservations, clashes, idx, team,
-                                        team_pairing_count), idx)
-                   for idx in range(len(clashes))]
-        ratings = [(rate, idx) for rate, idx in ratings if rate is not None]
-        ratings.sort()
-        assign_team_to_clash(clashes, reservations, ratings[0][1], team,
-                             team_pairing_count)
+        index.assign(index.best_clash(team_pairing_count),
+                     team_pairing_count)
 
 
 def reserve_team_slots(clashes, competitors, team_pairing_count, rnd=None,
-                       assign_single_competitor_teams=True):
+                       assign_single_competitor_teams=True, use_numpy=False):
     """
     :param clashes: the list of first round clashes
     :param competitors: the list of competitors
@@ -138,6 +342,9 @@ def reserve_team_slots(clashes, competitors, team_pairing_count, rnd=None,
         account the team_pairing_count_param to reduce the number
         of same team pairings. If not, those empty spots can later be
         assigned using the competitor rating.
+    :param use_numpy: rate the clashes with the NumPy backend (see
+        `bracketool.vectorized`). If NumPy is not installed, the pure
+        python one is used.
 
     :returns: list of team reservations for each clash:
         [[team_a, team_b], [team_c,], [], [team_b,]]
@@ -152,6 +359,7 @@ def reserve_team_slots(clashes, competitors, team_pairing_count, rnd=None,
     teams_with_required_slots = Counter([comp.team for comp in competitors
                                          if comp.team is not None])
     sorted_teams = shuffle_teams_sorted_by_slots(teams_with_required_slots, rnd)
+    index = _reservation_index_class(use_numpy)(clashes, reservations)
     for team in sorted_teams:
         cnt = teams_with_required_slots[team]
         if cnt == 1 and not assign_single_competitor_teams:
@@ -161,14 +369,246 @@ def reserve_team_slots(clashes, competitors, team_pairing_count, rnd=None,
                                team=team,
                                required_slots=cnt,
                                team_pairing_count=team_pairing_count,
-                               rnd=rnd)
+                               rnd=rnd,
+                               index=index)
+    return reservations
+
+
+def _pairing_count_size(team_pairing_count):
+    """Returns the number of pairs of a pairing count mapping (or an
+    upper bound, for overlays), without walking it."""
+    size = 0
+    while isinstance(team_pairing_count, PairingCountOverlay):
+        size += len(team_pairing_count.changes)
+        team_pairing_count = team_pairing_count.base
+    return size + len(team_pairing_count)
+
+
+def teams_pairing_count(team_pairing_count, teams):
+    """Returns a dict with the part of team_pairing_count that a
+    category (or a subtree) with the given teams can read or update.
+
+    It walks the pairing counts or looks up every pair of the teams,
+    whichever is shorter, so taking the part of a few teams from a
+    long history is cheap.
+    """
+    teams = sorted(teams)
+    # pairs of two teams, same team pairs and byes
+    num_pairs = len(teams) * (len(teams) + 3) // 2
+    if _pairing_count_size(team_pairing_count) <= num_pairs:
+        teams = set(teams)
+        return {pt: cnt for pt, cnt in team_pairing_count.items()
+                if (pt[0] is None or pt[0] in teams) and pt[1] in teams}
+    res = {}
+    for pos, team in enumerate(teams):
+        pairs = [(None, team)]
+        pairs.extend((team, other) for other in teams[pos:])
+        for pt in pairs:
+            cnt = team_pairing_count.get(pt)
+            if cnt:
+                res[pt] = cnt
+    return res
+
+
+def _split_team_quotas(quotas, left_slots, right_slots):
+    """Splits the number of slots of each team between the two halves
+    of a subtree: half of them to each one, and the odd slot to the
+    half with more free slots (alternating on ties).
+
+    :param quotas: list of (team, slots) for the subtree
+    :param left_slots: number of slots of the left half
+    :param right_slots: number of slots of the right half
+
+    :returns: the lists of (team, slots) for the left and right halves
+    """
+    free = [left_slots, right_slots]
+    halves = ([], [])
+    tie_side = 0
+    for team, count in quotas:
+        counts = [count // 2, count // 2]
+        if count % 2:
+            if free[0] != free[1]:
+                side = 0 if free[0] > free[1] else 1
+            else:
+                side = tie_side
+                tie_side ^= 1
+            counts[side] += 1
+        for side in (0, 1):
+            if counts[side]:
+                free[side] -= counts[side]
+                halves[side].append((team, counts[side]))
+    return halves
+
+
+def _reserve_subtree_slots(bye_mask, quotas, team_pairing_count, seed,
+                           use_numpy=False):
+    """Reserves the slots of the teams in a subtree, like
+    `reserve_team_slots` does for a whole bracket.
+
+    :param bye_mask: the bye flags of the subtree clashes
+    :param quotas: dict with the number of slots of each team
+    :param seed: seed to order the teams with the same number of slots
+
+    :returns: the reservations of the subtree clashes, and the updated
+        team_pairing_count
+    """
+    clashes = [Clash() for _ in bye_mask]
+    for clash, is_bye in zip(clashes, bye_mask):
+        clash.is_bye = bool(is_bye)
+    reservations = [list() for _ in clashes]
+    rnd = random.Random(seed)
+    index = _reservation_index_class(use_numpy)(clashes, reservations)
+    for team in shuffle_teams_sorted_by_slots(quotas, rnd):
+        reserve_slots_for_team(reservations, clashes, team, quotas[team],
+                               team_pairing_count, rnd, index)
+    return reservations, team_pairing_count
+
+
+def _same_team_pairs(reservations, num_levels):
+    """Returns, for each level, the number of pairs of slots reserved
+    for the same team inside the subtrees of 2 ** level clashes (the
+    pairs that can meet in the first level + 1 rounds)."""
+    team_clashes = {}
+    for idx, reserv in enumerate(reservations):
+        for team in reserv:
+            team_clashes.setdefault(team, []).append(idx)
+    pairs = [0] * num_levels
+    for idxs in team_clashes.values():
+        for level in range(num_levels):
+            counts = Counter(idx >> level for idx in idxs)
+            pairs[level] += sum(cnt * (cnt - 1) // 2
+                                for cnt in counts.values())
+    return pairs
+
+
+def _min_same_team_pairs(quotas, num_clashes, num_levels):
+    """Returns a lower bound of `_same_team_pairs` for any reservation
+    of the quotas: each team spread evenly among the subtrees of every
+    level (as if the other teams and the byes did not take slots)."""
+    pairs = [0] * num_levels
+    for _, count in quotas:
+        for level in range(num_levels):
+            num_subtrees = max(num_clashes >> level, 1)
+            size, bigger = divmod(count, num_subtrees)
+            pairs[level] += bigger * (size + 1) * size // 2 + \
+                (num_subtrees - bigger) * size * (size - 1) // 2
+    return pairs
+
+
+def reserve_team_slots_split(clashes, competitors, team_pairing_count,
+                             rnd=None, assign_single_competitor_teams=True,
+                             use_numpy=False, cutoff=64, processes=1):
+    """Divide and conquer version of `reserve_team_slots`.
+
+    The slots of each team are split in halves down the bracket tree
+    (see `_split_team_quotas`), until the subtrees have at most cutoff
+    clashes. Then each subtree is reserved on its own, with
+    `reserve_team_slots` logic, and they can be spread across worker
+    processes.
+
+    Members of the same team are split evenly at every level, which
+    keeps them far apart. When the result does not reach the bound of
+    `_min_same_team_pairs`, the whole bracket is also reserved with
+    `reserve_team_slots`, and the one with fewer same team pairs in
+    the earliest rounds is kept, so it is never worse than it.
+
+    The subtrees are reserved with the team_pairing_count as it was
+    before the call, and their new pairings are added to it afterwards,
+    so the result only depends on rnd, and not on the number of
+    processes.
+
+    :param cutoff: maximum number of clashes of the subtrees reserved
+        in a single task.
+    :param processes: number of worker processes (1 to reserve the
+        subtrees in this process, None for the number of processors).
+
+    :returns: list of team reservations for each clash
+    """
+    if rnd is None:
+        rnd = random.Random()
+        rnd.seed()
+    teams_with_required_slots = Counter([comp.team for comp in competitors
+                                         if comp.team is not None])
+    sorted_teams = shuffle_teams_sorted_by_slots(teams_with_required_slots,
+                                                 rnd)
+    quotas = [(team, teams_with_required_slots[team]) for team in sorted_teams
+              if assign_single_competitor_teams or
+              teams_with_required_slots[team] > 1]
+    bye_mask = bytes(1 if clash.is_bye else 0 for clash in clashes)
+    byes_before = [0]
+    for is_bye in bye_mask:
+        byes_before.append(byes_before[-1] + is_bye)
+
+    def slots(begin, size):
+        return 2 * size - (byes_before[begin + size] - byes_before[begin])
+
+    subtrees = []
+    pending = [(0, len(clashes), quotas)]
+    while pending:
+        begin, size, sub_quotas = pending.pop()
+        if size <= max(cutoff, 1) or not sub_quotas:
+            subtrees.append((begin, size, sub_quotas))
+            continue
+        half = size // 2
+        left, right = _split_team_quotas(sub_quotas, slots(begin, half),
+                                         slots(begin + half, half))
+        # the left half is popped first
+        pending.append((begin + half, half, right))
+        pending.append((begin, half, left))
+
+    tasks = []
+    previous_counts = []
+    for begin, size, sub_quotas in subtrees:
+        teams = {team for team, _ in sub_quotas}
+        previous_counts.append(
+            teams_pairing_count(team_pairing_count, teams))
+        tasks.append((bye_mask[begin:begin + size], dict(sub_quotas),
+                      dict(previous_counts[-1]), rnd.randint(0, 1 << 31),
+                      use_numpy))
+    if processes == 1:
+        results = [_reserve_subtree_slots(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_reserve_subtree_slots,
+                                        *zip(*tasks)))
+
+    reservations = []
+    new_pairings = {}
+    for previous_count, (sub_reservations, sub_pairing_count) in zip(
+            previous_counts, results):
+        reservations.extend(sub_reservations)
+        for pt, cnt in sub_pairing_count.items():
+            cnt -= previous_count.get(pt, 0)
+            if cnt:
+                new_pairings[pt] = new_pairings.get(pt, 0) + cnt
+
+    num_levels = len(clashes).bit_length()
+    pairs = _same_team_pairs(reservations, num_levels)
+    if pairs > _min_same_team_pairs(quotas, len(clashes), num_levels):
+        previous_count = teams_pairing_count(
+            team_pairing_count, {team for team, _ in quotas})
+        pairing_count = dict(previous_count)
+        whole = reserve_team_slots(
+            clashes, competitors, pairing_count,
+            random.Random(rnd.randint(0, 1 << 31)),
+            assign_single_competitor_teams, use_numpy)
+        if _same_team_pairs(whole, num_levels) < pairs:
+            reservations = whole
+            new_pairings = {pt: cnt - previous_count.get(pt, 0)
+                            for pt, cnt in pairing_count.items()
+                            if cnt != previous_count.get(pt, 0)}
+    for pt, cnt in new_pairings.items():
+        team_pairing_count[pt] = team_pairing_count.get(pt, 0) + cnt
     return reservations
 
 
 def create_reserved_teams_bracket_clashes(competitors,
                                           team_pairing_count=None,
                                           rnd=None,
-                                          assign_single_competitor_teams=True):
+                                          assign_single_competitor_teams=True,
+                                          use_numpy=False,
+                                          split_cutoff=None,
+                                          processes=1):
     """
         Initialize the brackets with the number of participants
         in the tournament.
@@ -188,13 +628,20 @@ def create_reserved_teams_bracket_clashes(competitors,
         that two teams have already faced each other. Can be used to
         add more variability, if we have other brackets where the
         same teams participate. Can be None, if we don't care about
-        other brackets.
+        other brackets. It can also be a
+        `bracketool.pairinghistory.TeamPairingHistory`.
     :param rnd: The random.Random object use to shuffle teams that have
         the same number of competitors
     :param assign_single_competitor_teams: To reserve spots for teams
         that only have one competitor (Setting it to False, would
         allow more flexibility to assign competitor by other properties
         like the rank).
+    :param use_numpy: rate the clashes with the NumPy backend, if it
+        is installed.
+    :param split_cutoff: if set, reserve the slots with
+        `reserve_team_slots_split`, solving subtrees of at most this
+        number of clashes on their own.
+    :param processes: worker processes for `reserve_team_slots_split`.
 
     :returns: a list of clashes with non assigned competitors, and
         the list of team reservations.
@@ -202,14 +649,20 @@ def create_reserved_teams_bracket_clashes(competitors,
     clashes = generate_first_round_clashes(len(competitors))
     # create a temporary track of how team pairing would be distributed,
     # but real team_pairing_count is updated when competitors are
-    # assigned
+    # assigned (the overlay does not copy it)
     if team_pairing_count is None:
         pairing_count = {}
     else:
-        pairing_count = dict(team_pairing_count)
-    team_reservations = reserve_team_slots(
-            clashes, competitors, pairing_count, rnd,
-            assign_single_competitor_teams)
+        pairing_count = PairingCountOverlay(team_pairing_count)
+    if split_cutoff:
+        team_reservations = reserve_team_slots_split(
+                clashes, competitors, pairing_count, rnd,
+                assign_single_competitor_teams, use_numpy, split_cutoff,
+                processes)
+    else:
+        team_reservations = reserve_team_slots(
+                clashes, competitors, pairing_count, rnd,
+                assign_single_competitor_teams, use_numpy)
     return clashes, team_reservations
 
 
@@ -0,0 +1,147 @@
+"""NumPy versions of the indices used to reserve team slots and to
+place competitors by rating.
+
+Instead of walking the bracket tree, they keep a vector with a value
+for each first round clash, and rate all the candidate clashes with
+a single batched operation over the rows of the distance table.
+
+NumPy is optional: `numpy_available` tells if these classes can be
+used, and generators fall back to the pure python indices when it
+is not installed. Both versions produce the same brackets.
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+
+from bracketool.brackets import SubtreeOccupancy
+from bracketool.brackets import depth_distance_table
+from bracketool.teambrackets import TeamReservationIndex
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def numpy_available():
+    """Returns True if NumPy can be imported."""
+    return np is not None
+
+
+@lru_cache(maxsize=8)
+def depth_distance_matrix(num_clashes):
+    """Returns the `depth_distance_table` as a read only NumPy
+    uint8 matrix. It is built once for each size, and cached."""
+    rows = depth_distance_table(num_clashes)
+    matrix = np.frombuffer(b''.join(rows), dtype=np.uint8)
+    return matrix.reshape((num_clashes, num_clashes))
+
+
+class NumpySubtreeOccupancy(SubtreeOccupancy):
+    """`SubtreeOccupancy` that keeps a vector of occupied clashes and
+    computes the distance sums of all the options at once."""
+
+    def __init__(self, clashes):
+        self.distances = depth_distance_matrix(len(clashes))
+        self.occupied = np.zeros(len(clashes), dtype=np.int32)
+        self.available = np.zeros(len(clashes), dtype=bool)
+        for idx, clash in enumerate(clashes):
+            if clash.competitor_a:
+                self.occupy(idx)
+
+    def occupy(self, idx):
+        self.occupied[idx] = 1
+
+    def distance_sum(self, idx):
+        return int(np.dot(self.distances[idx], self.occupied))
+
+    def farthest(self, options):
+        opts = np.asarray(options, dtype=np.intp)
+        sums = np.dot(self.distances[opts], self.occupied)
+        return int(opts[sums == sums.max()].max())
+
+    def set_available(self, idx, available):
+        self.available[idx] = available
+
+    def farthest_available(self):
+        opts = np.flatnonzero(self.available)
+        return self.farthest(opts) if len(opts) else None
+
+
+class NumpyTeamReservationIndex(TeamReservationIndex):
+    """`TeamReservationIndex` that keeps the rating of every clash in
+    a vector.
+
+    Changing the penalty of a clash adds the depth weighted row of the
+    distance table to the ratings vector, and the best clash is found
+    with a single pass over the vector.
+    """
+
+    def __init__(self, clashes, reservations):
+        num_clashes = len(clashes)
+        self.clashes = clashes
+        self.reservations = reservations
+        self.num_clashes = num_clashes
+        self.same_team_factor = num_clashes * num_clashes * 4
+        self.team = None
+        self.team_weights = {}
+        self.team_clashes = defaultdict(list)
+        for idx, reserv in enumerate(reservations):
+            for team in reserv:
+                self.team_clashes[team].append(idx)
+        self.distances = depth_distance_matrix(num_clashes)
+        self.max_weight = num_clashes.bit_length() + 1
+        self.ratings = np.zeros(num_clashes, dtype=np.int64)
+        self.is_bye = np.array([clash.is_bye for clash in clashes],
+                               dtype=bool)
+        self.available = np.zeros(num_clashes, dtype=bool)
+        self.same_team = np.zeros(num_clashes, dtype=bool)
+        for idx in range(num_clashes):
+            self._update(idx)
+
+    def _update(self, idx, penalty=0):
+        if penalty:
+            self.ratings += penalty * (
+                self.max_weight - self.distances[idx].astype(np.int64))
+        reserv = self.reservations[idx]
+        self.available[idx] = not (
+            len(reserv) == 2 or (len(reserv) == 1 and self.is_bye[idx]))
+        self.same_team[idx] = self.team is not None and self.team in reserv
+
+    def _add_team_clash(self, team, idx):
+        self.team_clashes[team].append(idx)
+
+    def _add_team_weight(self, team, weight):
+        if weight:
+            self.team_weights[team] = self.team_weights.get(team, 0) + \
+                weight
+        idxs = self.team_clashes.get(team)
+        if not idxs:
+            return
+        if weight:
+            self.ratings += weight * (
+                len(idxs) * self.max_weight -
+                self.distances[idxs].sum(axis=0, dtype=np.int64))
+        for idx in idxs:
+            self._update(idx)
+
+    def rating(self, clash_idx, team_pairing_count):
+        if not self.available[clash_idx]:
+            return None
+        rating = int(self.ratings[clash_idx])
+        if self.is_bye[clash_idx]:
+            rating += team_pairing_count.get((None, self.team), 0)
+        return (int(self.same_team[clash_idx]), rating)
+
+    def best_clash(self, team_pairing_count):
+        candidates = self.available
+        if not candidates.any():
+            raise IndexError('No available clash for team {}'.format(
+                self.team))
+        other_team = candidates & ~self.same_team
+        if other_team.any():
+            candidates = other_team
+        ratings = self.ratings + self.is_bye * \
+            team_pairing_count.get((None, self.team), 0)
+        best = ratings[candidates].min()
+        return int(np.flatnonzero(candidates & (ratings == best))[0])
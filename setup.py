@@ -8,6 +8,9 @@ setup(name='bracketool',
       author_email='dhontecillas@gmail.com',
       license='MIT',
       packages=['bracketool'],
+      extras_require={
+          'numpy': ['numpy'],
+      },
       classifiers=[
           "Programming Language :: Python :: 3",
       ],
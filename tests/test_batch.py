@@ -0,0 +1,65 @@
+import unittest
+
+from bracketool.batch import generate_categories
+from bracketool.domain import Competitor
+from bracketool.instrumentation import Instrumentation
+from bracketool.single_elimination import SingleEliminationGen
+
+
+def categories():
+    return {
+        'cat{}'.format(cat): [
+            Competitor('comp{}-{}'.format(cat, num),
+                       'team{}'.format((cat + num) % 4), 1000 + num * 7)
+            for num in range(5 + cat * 3)]
+        for cat in range(6)}
+
+
+class GenerateCategoriesTest(unittest.TestCase):
+
+    def test_instrumentation_callback_in_parent(self):
+        reports = []
+        instrumentation = Instrumentation(lambda report: reports.append(
+            report))
+        generator = SingleEliminationGen(random_seed=5,
+                                         instrumentation=instrumentation)
+        results = generate_categories(generator, categories(), processes=2)
+        self.assertEqual(len(reports), len(results))
+        for report in reports:
+            self.assertIn('pairings', report['timings'])
+        self.assertIs(instrumentation.last_report, reports[-1])
+
+    def check_same_results_as_sequential(self, categories,
+                                         team_pairing_count):
+        def names(results):
+            return {cat_id: [(clash.competitor_a and clash.competitor_a.name,
+                              clash.competitor_b and clash.competitor_b.name)
+                             for clash in res.all]
+                    for cat_id, res in results.items()}
+
+        counts = []
+        results = []
+        for processes in (1, 3):
+            counts.append(dict(team_pairing_count))
+            results.append(names(generate_categories(
+                SingleEliminationGen(random_seed=5), categories,
+                counts[-1], processes=processes)))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(counts[0], counts[1])
+
+    def test_same_results_as_sequential(self):
+        self.check_same_results_as_sequential(categories(), {})
+
+    def test_falsy_team_ids(self):
+        int_team_categories = {
+            'cat{}'.format(cat): [
+                Competitor('comp{}-{}'.format(cat, num), (num + cat) % 3,
+                           1000 + num * 7)
+                for num in range(6 + cat)]
+            for cat in range(4)}
+        self.check_same_results_as_sequential(int_team_categories,
+                                              {(0, 1): 5, (None, 0): 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
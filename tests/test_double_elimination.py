@@ -0,0 +1,37 @@
+import itertools
+import unittest
+
+from bracketool.double_elimination import _loser_drop_masks
+from bracketool.double_elimination import _rematches_key
+from bracketool.double_elimination import _spread_loser_drop_masks
+
+
+def all_pairs(num_rounds):
+    return [(rx, ry) for ry in range(num_rounds) for rx in range(ry)]
+
+
+class LoserDropMasksTest(unittest.TestCase):
+
+    def test_optimal_for_small_brackets(self):
+        for num_rounds in range(2, 7):
+            options = [range(1 << (num_rounds - 1 - nr))
+                       for nr in range(1, num_rounds)]
+            best = min(_rematches_key([0] + list(masks), num_rounds,
+                                      all_pairs(num_rounds))
+                       for masks in itertools.product(*options))
+            self.assertEqual(
+                _rematches_key(_loser_drop_masks(num_rounds), num_rounds,
+                               all_pairs(num_rounds)), best)
+
+    def test_not_worse_than_spread_masks(self):
+        for num_rounds in range(2, 11):
+            spread = _rematches_key(_spread_loser_drop_masks(num_rounds),
+                                    num_rounds, all_pairs(num_rounds))
+            key = _rematches_key(_loser_drop_masks(num_rounds), num_rounds,
+                                 all_pairs(num_rounds))
+            self.assertEqual(key[0], spread[0])
+            self.assertLessEqual(key[1], spread[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from bracketool.domain import Clash, Competitor
+from bracketool.evaluation import bracket_metrics
+
+
+def first_round(byes, top_bye_idxs):
+    """Eight clashes with byes in the given clashes, held by a top
+    competitor in top_bye_idxs. Returns the clashes and the top
+    competitors."""
+    clashes = []
+    top = []
+    for idx in range(8):
+        comp = Competitor(str(idx), None, idx)
+        clash = Clash(comp)
+        if idx in byes:
+            clash.is_bye = True
+        else:
+            clash.competitor_b = Competitor(str(idx + 8), None, idx + 8)
+        if idx in top_bye_idxs:
+            top.append(comp)
+        clashes.append(clash)
+    return clashes, top
+
+
+class BracketMetricsTest(unittest.TestCase):
+
+    def test_top_seeds_with_spread_byes(self):
+        clashes, top = first_round({0, 2, 4, 6}, {0, 4})
+        metrics = bracket_metrics(clashes, top)
+        self.assertEqual(metrics['top_seeds_missing_byes'], 0)
+        self.assertEqual(metrics['top_seeds_byes_imbalance'], 1)
+
+    def test_top_seeds_byes_in_one_half(self):
+        clashes, top = first_round({0, 2, 4, 6}, {0, 2})
+        metrics = bracket_metrics(clashes, top)
+        self.assertEqual(metrics['top_seeds_missing_byes'], 0)
+        self.assertEqual(metrics['top_seeds_byes_imbalance'], 2)
+
+    def test_top_seeds_without_byes(self):
+        clashes, top = first_round({0, 2}, {1, 3, 5})
+        metrics = bracket_metrics(clashes, top)
+        self.assertEqual(metrics['top_seeds_missing_byes'], 2)
+        self.assertEqual(metrics['top_seeds_byes_imbalance'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
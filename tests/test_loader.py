@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from bracketool.loader import load_categories_csv
+from bracketool.ratingstore import EloRatingStore
+
+
+CSV = '''category,name,team,rating
+senior,Ann,blue,17
+senior,Bob,,42
+junior,Cid,red,5
+senior,Dan,blue,99
+'''
+
+
+class LoadCategoriesCsvTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.tmpdir, 'categories.csv')
+        with open(self.csv_path, 'w') as f:
+            f.write(CSV)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_ratings_from_the_column(self):
+        categories = load_categories_csv(self.csv_path)
+        self.assertEqual(list(categories), ['senior', 'junior'])
+        self.assertEqual(
+            [(comp.name, comp.team, comp.rating)
+             for comp in categories['senior']],
+            [('Dan', 'blue', 99), ('Bob', None, 42), ('Ann', 'blue', 17)])
+
+    def test_ratings_from_a_rating_store(self):
+        store_path = os.path.join(self.tmpdir, 'ratings.elo')
+        with EloRatingStore.create(store_path, 10,
+                                   initial_rating=1000) as store:
+            store.record(17, 5, True)
+            categories = load_categories_csv(self.csv_path,
+                                             ratings=store.rating)
+            self.assertEqual(
+                [(comp.name, comp.rating) for comp in categories['senior']],
+                [('Ann', store.rating(17)), ('Dan', 1000), ('Bob', 1000)])
+            self.assertEqual(categories['junior'][0].rating,
+                             store.rating(5))
+            self.assertGreater(store.rating(17), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
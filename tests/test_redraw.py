@@ -0,0 +1,101 @@
+import random
+import unittest
+
+from bracketool.brackets import generate_first_round_clashes
+from bracketool.domain import Competitor
+from bracketool.pairings import PairingsGenerator
+from bracketool.redraw import FirstRoundEditor
+
+
+def competitors(num, first=0):
+    return [Competitor('comp{}'.format(num), 'team{}'.format(num % 4),
+                       1000 + num)
+            for num in range(first, first + num)]
+
+
+def count_pairings(clashes):
+    team_pairing_count = {}
+    for clash in clashes:
+        if clash.is_bye or clash.competitor_b is None:
+            continue
+        teams = sorted((clash.competitor_a.team, clash.competitor_b.team))
+        pt = tuple(teams)
+        team_pairing_count[pt] = team_pairing_count.get(pt, 0) + 1
+    return team_pairing_count
+
+
+class FirstRoundEditorTest(unittest.TestCase):
+
+    def check_editor(self, editor, entrants):
+        clashes = editor.clashes
+        fresh = generate_first_round_clashes(len(entrants))
+        self.assertEqual(len(clashes), max(len(fresh), len(entrants[:1])))
+        self.assertEqual(sum(clash.is_bye for clash in clashes),
+                         2 * len(clashes) - len(entrants))
+        placed = [comp for clash in clashes
+                  for comp in (clash.competitor_a, clash.competitor_b)
+                  if comp is not None]
+        self.assertEqual(sorted(comp.name for comp in placed),
+                         sorted(comp.name for comp in entrants))
+        for idx, clash in enumerate(clashes):
+            self.assertIsNotNone(clash.competitor_a)
+            self.assertEqual(clash.is_bye, clash.competitor_b is None)
+            self.assertEqual(editor.clash_index(clash.competitor_a), idx)
+        self.assertEqual(editor.team_pairing_count, count_pairings(clashes))
+
+    def generate(self, num):
+        entrants = competitors(num)
+        team_pairing_count = {}
+        clashes = PairingsGenerator(random_seed=1).generate(
+            entrants, team_pairing_count)
+        editor = FirstRoundEditor(clashes,
+                                  team_pairing_count=team_pairing_count)
+        self.check_editor(editor, entrants)
+        return editor, entrants
+
+    def test_withdraw_from_the_only_fight_halves_the_bracket(self):
+        editor, entrants = self.generate(17)
+        fight = [clash for clash in editor.clashes if not clash.is_bye]
+        self.assertEqual(len(fight), 1)
+        entrants.remove(fight[0].competitor_b)
+        editor.remove(fight[0].competitor_b)
+        self.assertEqual(len(editor.clashes), 8)
+        self.check_editor(editor, entrants)
+
+    def test_remove_and_add_round_trip(self):
+        rnd = random.Random(5)
+        for num in (2, 9, 16, 17, 33):
+            editor, entrants = self.generate(num)
+            while entrants:
+                comp = entrants.pop(rnd.randrange(len(entrants)))
+                editor.remove(comp)
+                self.check_editor(editor, entrants)
+            for comp in competitors(num, 100):
+                entrants.append(comp)
+                editor.add(comp)
+                self.check_editor(editor, entrants)
+
+    def test_late_entry_takes_a_reserved_spot(self):
+        editor, entrants = self.generate(12)
+        idx, clash = next((idx, clash)
+                          for idx, clash in enumerate(editor.clashes)
+                          if not clash.is_bye)
+        withdrawn = clash.competitor_b
+        entrants.remove(withdrawn)
+        reservations = [list() for _ in editor.clashes]
+        reservations[idx].append(withdrawn.team)
+        editor.remove(withdrawn)
+        # leave the spot of the withdrawn competitor open for its team
+        clash.is_bye = False
+        editor = FirstRoundEditor(editor.clashes, reservations,
+                                  editor.team_pairing_count)
+        late = Competitor('late', withdrawn.team, 0)
+        entrants.append(late)
+        self.assertEqual(editor.add(late), [idx])
+        self.assertEqual(editor.clash_index(late), idx)
+        self.assertEqual(reservations[idx], [])
+        self.check_editor(editor, entrants)
+
+
+if __name__ == '__main__':
+    unittest.main()
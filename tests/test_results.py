@@ -0,0 +1,78 @@
+import random
+import unittest
+
+from bracketool.domain import Competitor
+from bracketool.double_elimination import DoubleEliminationGen
+from bracketool.results import BracketResults
+from bracketool.single_elimination import SingleEliminationGen
+
+
+def competitors(num):
+    return [Competitor('comp{}'.format(num), 'team{}'.format(num % 3),
+                       1000 + num) for num in range(num)]
+
+
+def play(bracket, rnd):
+    """Plays the bracket, with the higher rated competitor always
+    winning, taking the ready clashes in random order."""
+    results = BracketResults(bracket)
+    ready = []
+    while True:
+        idx = results.next_clash()
+        while idx is not None:
+            ready.append(idx)
+            idx = results.next_clash()
+        if not ready:
+            break
+        idx = ready.pop(rnd.randrange(len(ready)))
+        clash = bracket.all[idx]
+        results.record_result(idx, max(
+            clash.competitor_a, clash.competitor_b,
+            key=lambda comp: comp.rating))
+    return [(clash.competitor_a, clash.competitor_b)
+            for clash in bracket.all]
+
+
+class BracketResultsTest(unittest.TestCase):
+
+    def check_slots_do_not_depend_on_order(self, generator_class, **kw):
+        for num in (3, 8, 13, 32):
+            layouts = set()
+            for order_seed in range(5):
+                bracket = generator_class(random_seed=11, **kw).generate(
+                    competitors(num))
+                layout = play(bracket, random.Random(order_seed))
+                layouts.add(tuple(
+                    (comp_a and comp_a.name, comp_b and comp_b.name)
+                    for comp_a, comp_b in layout))
+            self.assertEqual(len(layouts), 1)
+
+    def test_single_elimination(self):
+        self.check_slots_do_not_depend_on_order(SingleEliminationGen)
+
+    def test_single_elimination_third_place(self):
+        self.check_slots_do_not_depend_on_order(
+            SingleEliminationGen, third_place_clash=True,
+            use_three_way_final=False)
+
+    def test_double_elimination(self):
+        self.check_slots_do_not_depend_on_order(DoubleEliminationGen)
+
+    def test_upper_feeder_takes_first_slot(self):
+        bracket = SingleEliminationGen(random_seed=3).generate(
+            competitors(8))
+        results = BracketResults(bracket)
+        first_round = bracket.rounds[0]
+        for idx in reversed(range(len(first_round))):
+            clash = first_round[idx]
+            results.record_result(idx, clash.competitor_a)
+        for clash in bracket.rounds[1]:
+            self.assertIsNotNone(clash.competitor_a)
+        self.assertIs(bracket.rounds[1][0].competitor_a,
+                      first_round[0].competitor_a)
+        self.assertIs(bracket.rounds[1][0].competitor_b,
+                      first_round[1].competitor_a)
+
+
+if __name__ == '__main__':
+    unittest.main()
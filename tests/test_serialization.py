@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from bracketool.domain import Competitor
+from bracketool.serialization import dump, dumps, load, loads
+from bracketool.single_elimination import SingleEliminationGen
+
+
+def names(bracket):
+    return [(clash.competitor_a and (clash.competitor_a.name,
+                                     clash.competitor_a.team),
+             clash.competitor_b and (clash.competitor_b.name,
+                                     clash.competitor_b.team))
+            for clash in bracket.all]
+
+
+class SerializationTest(unittest.TestCase):
+
+    def bracket(self):
+        competitors = [Competitor(num, num % 3 if num % 4 else None,
+                                  1000 + num) for num in range(11)]
+        competitors.append(Competitor('named', None, 1200))
+        return SingleEliminationGen(random_seed=4).generate(competitors)
+
+    def test_keeps_names_and_teams_types(self):
+        bracket = self.bracket()
+        loaded = loads(dumps(bracket))
+        self.assertEqual(names(loaded), names(bracket))
+        for clash in loaded.all:
+            for comp in (clash.competitor_a, clash.competitor_b):
+                if comp is not None and comp.name != 'named':
+                    self.assertIsInstance(comp.name, int)
+
+    def test_file(self):
+        bracket = self.bracket()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'bracket.bin')
+            dump(bracket, path)
+            self.assertEqual(names(load(path)), names(bracket))
+
+    def test_rejects_other_types(self):
+        bracket = SingleEliminationGen(random_seed=4).generate(
+            [Competitor(('a', 1), 'team', 1), Competitor('b', 'team', 2)])
+        with self.assertRaises(TypeError):
+            dumps(bracket)
+
+
+if __name__ == '__main__':
+    unittest.main()
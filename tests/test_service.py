@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+
+from bracketool.domain import Competitor
+from bracketool.instrumentation import Instrumentation
+from bracketool.service import BracketService
+from bracketool.single_elimination import SingleEliminationGen
+
+
+def categories():
+    return [[Competitor('comp{}-{}'.format(cat, num),
+                        'team{}'.format((cat + num) % 4), 1000 + num * 7)
+             for num in range(6 + cat * 5)]
+            for cat in range(6)]
+
+
+def names(bracket):
+    return [(clash.competitor_a and clash.competitor_a.name,
+             clash.competitor_b and clash.competitor_b.name)
+            for clash in bracket.all]
+
+
+class BracketServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def generate_all(self, service, team_pairing_count):
+        async def generate_all():
+            with_service = await asyncio.gather(*(
+                service.generate(cat, competitors, cat + 1,
+                                 team_pairing_count)
+                for cat, competitors in enumerate(categories())))
+            service.close()
+            return with_service
+        return self.loop.run_until_complete(generate_all())
+
+    def test_shared_teams_same_as_sequential(self):
+        team_pairing_count = {}
+        brackets = self.generate_all(BracketService(max_workers=3),
+                                     team_pairing_count)
+        expected_count = {}
+        expected = [SingleEliminationGen(random_seed=cat + 1).generate(
+                        competitors, expected_count)
+                    for cat, competitors in enumerate(categories())]
+        self.assertEqual(team_pairing_count, expected_count)
+        self.assertEqual([names(bracket) for bracket in brackets],
+                         [names(bracket) for bracket in expected])
+
+    def test_instrumentation_reports(self):
+        reports = []
+        service = BracketService(max_workers=2, instrumentation=(
+            Instrumentation(lambda report: reports.append(report))))
+        self.generate_all(service, {})
+        self.assertEqual(len(reports), len(categories()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from bracketool.domain import Competitor
+from bracketool.results import BracketResults
+from bracketool.single_elimination import SingleEliminationGen
+from bracketool import simulation
+
+
+def three_competitors():
+    return [Competitor('A', 'team1', 2000), Competitor('B', 'team2', 1500),
+            Competitor('C', 'team3', 1000)]
+
+
+class ThreeWayFinalTest(unittest.TestCase):
+
+    def generate(self, team_pairing_count=None):
+        return SingleEliminationGen(random_seed=3).generate(
+            three_competitors(), team_pairing_count)
+
+    def test_layout(self):
+        bracket = self.generate()
+        self.assertEqual([len(rnd) for rnd in bracket.rounds], [2, 2])
+        first_round = {comp.name for clash in bracket.rounds[0]
+                       for comp in (clash.competitor_a, clash.competitor_b)
+                       if comp is not None}
+        self.assertEqual(first_round, {'A', 'B', 'C'})
+        offset = 0
+        for rnd, next_rnd in zip(bracket.rounds, bracket.rounds[1:]):
+            offset += len(rnd)
+            for clash in rnd:
+                self.assertTrue(
+                    offset <= clash.winner_to < offset + len(next_rnd))
+
+    def test_each_competitor_faces_the_other_two(self):
+        bracket = self.generate()
+        results = BracketResults(bracket)
+        pairs = set()
+        idx = results.next_clash()
+        while idx is not None:
+            clash = bracket.all[idx]
+            pairs.add(frozenset((clash.competitor_a.name,
+                                 clash.competitor_b.name)))
+            results.record_result(idx, clash.competitor_a)
+            idx = results.next_clash()
+        self.assertEqual(pairs, {frozenset('AB'), frozenset('AC'),
+                                 frozenset('BC')})
+
+    def test_team_pairing_count(self):
+        team_pairing_count = {}
+        self.generate(team_pairing_count)
+        pairs = {pt: cnt for pt, cnt in team_pairing_count.items()
+                 if pt[0] is not None}
+        self.assertEqual(pairs, {('team1', 'team2'): 1,
+                                 ('team1', 'team3'): 1,
+                                 ('team2', 'team3'): 1})
+
+    @unittest.skipUnless(simulation.np is not None, 'requires NumPy')
+    def test_simulation(self):
+        probabilities = simulation.simulate_bracket(
+            self.generate(), num_simulations=2000, random_seed=1)
+        self.assertEqual({comp.name for comp in probabilities},
+                         {'A', 'B', 'C'})
+        self.assertAlmostEqual(
+            sum(probs[-1] for probs in probabilities.values()), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
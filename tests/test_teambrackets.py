@@ -0,0 +1,146 @@
+import random
+import unittest
+from collections import Counter
+
+from bracketool.brackets import generate_first_round_clashes
+from bracketool.domain import Competitor
+from bracketool.pairinghistory import TeamPairingHistory
+from bracketool.teambrackets import TeamReservationIndex
+from bracketool.teambrackets import rate_clash_for_team
+from bracketool.teambrackets import reserve_team_slots
+from bracketool.teambrackets import reserve_team_slots_split
+from bracketool.teambrackets import teams_pairing_count
+from bracketool import vectorized
+
+
+class TeamReservationIndexTest(unittest.TestCase):
+
+    index_class = TeamReservationIndex
+
+    def check_ratings(self, index, clashes, reservations, team,
+                      team_pairing_count):
+        for idx in range(len(clashes)):
+            self.assertEqual(
+                index.rating(idx, team_pairing_count),
+                rate_clash_for_team(reservations, clashes, idx, team,
+                                    team_pairing_count))
+
+    def test_ratings_match_rate_clash_for_team(self):
+        rnd = random.Random(7)
+        for num_competitors in (2, 5, 16, 23, 61):
+            clashes = generate_first_round_clashes(num_competitors)
+            reservations = [list() for _ in clashes]
+            teams = ['team{}'.format(num) for num in range(5)]
+            team_pairing_count = {}
+            for team_a in teams:
+                team_pairing_count[(None, team_a)] = rnd.randint(0, 3)
+                for team_b in teams:
+                    if team_a < team_b:
+                        team_pairing_count[(team_a, team_b)] = \
+                            rnd.randint(0, 3)
+            index = self.index_class(clashes, reservations)
+            free_slots = num_competitors
+            while free_slots:
+                team = rnd.choice(teams)
+                index.set_team(team, team_pairing_count)
+                self.check_ratings(index, clashes, reservations, team,
+                                   team_pairing_count)
+                for _ in range(min(free_slots, rnd.randint(1, 4))):
+                    index.assign(index.best_clash(team_pairing_count),
+                                 team_pairing_count)
+                    free_slots -= 1
+                    self.check_ratings(index, clashes, reservations, team,
+                                       team_pairing_count)
+
+
+class TeamsPairingCountTest(unittest.TestCase):
+
+    def test_walk_and_lookups_give_the_same_part(self):
+        rnd = random.Random(3)
+        history = {}
+        for _ in range(300):
+            team_a, team_b = sorted(rnd.sample(range(30), 2))
+            history[('t{:02}'.format(team_a), 't{:02}'.format(team_b))] = \
+                rnd.randint(1, 3)
+            history[(None, 't{:02}'.format(team_b))] = 1
+        for num_teams in (1, 3, 10, 30):
+            teams = {'t{:02}'.format(num) for num in range(num_teams)}
+            expected = {pt: cnt for pt, cnt in history.items()
+                        if (pt[0] is None or pt[0] in teams) and
+                        pt[1] in teams}
+            for counts in (history, TeamPairingHistory(history),
+                           TeamPairingHistory(history).overlay()):
+                self.assertEqual(teams_pairing_count(counts, teams),
+                                 expected)
+
+
+def same_team_pairs(reservations, num_clashes):
+    """Number of pairs of slots of the same team that can meet in
+    each round."""
+    pairs = []
+    for level in range(num_clashes.bit_length()):
+        counts = Counter((idx >> level, team)
+                         for idx, reserv in enumerate(reservations)
+                         for team in reserv)
+        pairs.append(sum(cnt * (cnt - 1) // 2 for cnt in counts.values()))
+    return pairs
+
+
+def reservation_pairing_count(clashes, reservations):
+    team_pairing_count = {}
+    for clash, reserv in zip(clashes, reservations):
+        if len(reserv) == 2:
+            pt = (min(reserv), max(reserv))
+        elif clash.is_bye and reserv:
+            pt = (None, reserv[0])
+        else:
+            continue
+        team_pairing_count[pt] = team_pairing_count.get(pt, 0) + 1
+    return team_pairing_count
+
+
+class ReserveTeamSlotsSplitTest(unittest.TestCase):
+
+    def check_not_worse(self, competitors, seed, cutoff):
+        clashes = generate_first_round_clashes(len(competitors))
+        whole = reserve_team_slots(clashes, competitors, {},
+                                   random.Random(seed))
+        team_pairing_count = {}
+        split = reserve_team_slots_split(clashes, competitors,
+                                         team_pairing_count,
+                                         random.Random(seed), cutoff=cutoff)
+        self.assertLessEqual(same_team_pairs(split, len(clashes)),
+                             same_team_pairs(whole, len(clashes)))
+        self.assertEqual(sorted(team for reserv in split for team in reserv),
+                         sorted(comp.team for comp in competitors))
+        self.assertEqual(team_pairing_count,
+                         reservation_pairing_count(clashes, split))
+
+    def test_uneven_teams_are_not_worse(self):
+        # splitting alone leaves 5 pairs that can meet in the second
+        # round, while reserving the whole bracket leaves 4
+        competitors = [Competitor('{}{}'.format(team, num), team, 0)
+                       for team, size in (('a', 12), ('b', 7), ('c', 7),
+                                          ('d', 3))
+                       for num in range(size)]
+        self.check_not_worse(competitors, 78, 4)
+
+    def test_random_categories_are_not_worse(self):
+        rnd = random.Random(11)
+        for seed in range(100):
+            num_teams = rnd.randint(1, 8)
+            competitors = [
+                Competitor(str(num), 't{}'.format(rnd.randrange(num_teams)),
+                           0)
+                for num in range(rnd.randint(5, 64))]
+            self.check_not_worse(competitors, seed, rnd.choice((1, 2, 4, 8)))
+
+
+@unittest.skipUnless(vectorized.numpy_available(), 'requires NumPy')
+class NumpyTeamReservationIndexTest(TeamReservationIndexTest):
+
+    index_class = vectorized.NumpyTeamReservationIndex
+
+
+if __name__ == '__main__':
+    unittest.main()